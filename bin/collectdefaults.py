@@ -10,12 +10,14 @@
 # directories under /nfs/site/proj/simics/users/jlmayfie/logs (or your current target directory).
 
 import argparse # argument parsing
-import glob # recursive file search
 import os # path functions
 import datetime # fromtimestamp
 import subprocess # Popen
 
 from shutil import copyfile
+from file_walker import find_files # recursive scandir search
+from log_scanner import read_summary_lines # summary block reader
+from dedup_store import DedupStore, get_default_store # --dedup object store
 
 STYLE_OS = 0
 STYLE_LINUX = 1
@@ -43,6 +45,7 @@ def parse_args():
     parser = argparse.ArgumentParser(description="Recursively finds default_fuse_values.txt files and copies uniquely-named versions to a given target directory.")
     parser.add_argument('-f', '--fusedir', type=str, default=".", help='Directory to recursively search for default_fuse_values files.')
     parser.add_argument('-t', '--targetdir', type=str, required=True, help='Directory to copy renamed fuse files to.')
+    parser.add_argument('--dedup', action='store_true', help='Store each distinct fuse file once under <targetdir>/.objects and hardlink it into targetdir.')
     args = parser.parse_args()
     return args
 
@@ -63,43 +66,6 @@ def get_git_branch(curpath):
 
     return (success, curbranch)
 
-def tail(filename, lines=10):
-    # adapted from: https://stackoverflow.com/questions/136168/get-last-n-lines-of-a-file-similar-to-tail
-
-    if lines == 0:
-        print("ERROR: Must specify at least 1 line to return.")
-        return []
-
-    f = open(filename, "rb")
-
-    BUFSIZ = 1024
-    f.seek(0, 2)
-    remaining_bytes = f.tell()
-    size = lines + 1
-    block = -1
-    data = []
-
-    while size > 0 and remaining_bytes > 0:
-        if remaining_bytes - BUFSIZ > 0:
-            # Seek back one whole BUFSIZ
-            f.seek(block * BUFSIZ, 2)
-            # read BUFFER
-            bunch = f.read(BUFSIZ)
-        else:
-            # file too small, start from beginning
-            f.seek(0, 0)
-            # only read what was not read
-            bunch = f.read(remaining_bytes)
-
-        bunch = bunch.decode('utf-8')
-        data.insert(0, bunch)
-        size -= bunch.count('\n')
-        remaining_bytes -= BUFSIZ
-        block -= 1
-
-    f.close()
-    return ''.join(data).splitlines()[-lines:]
-
 def find_test_logs(dir, filename = "test.log"):
     foundfiles = []
     # confirm directory exists
@@ -108,9 +74,7 @@ def find_test_logs(dir, filename = "test.log"):
         return foundfiles
 
     # do recursive search for files matching filename
-    searchspec = os.path.join(dir, '**')
-    searchspec = os.path.join(searchspec, filename)
-    foundfiles = glob.glob(searchspec, recursive=True)
+    foundfiles = list(find_files(dir, filename))
 
     # return list of filenames
     return foundfiles
@@ -191,7 +155,7 @@ def collect_logs(filelist, target, branchname):
     # collect test results (at end of file)
     for curfile in filelist:
         # print(f"FILE: {curfile}")
-        curlines = tail(curfile)
+        curlines = read_summary_lines(curfile)
         TestResult.RESULT_ERROR
         testname = ""
         curresult, testname = extract_result(curfile, curlines, branchname)
@@ -245,6 +209,10 @@ if __name__ == "__main__":
     except OSError as e:
         print(f'ERROR: verify_directory unable to make directory {args.targetdir} ({e.strerror})')
 
+    store = None
+    if (args.dedup):
+        store = DedupStore(get_default_store(args.targetdir))
+
     for cur_file in found_files:
         # get actual filename
         filepart1 = os.path.basename(cur_file)
@@ -254,7 +222,14 @@ if __name__ == "__main__":
         target_path = os.path.join(args.targetdir, filepart2 + "_" + filepart1)
         print(f"target_path: {target_path}")
 
+        if (store is not None):
+            # store_file prints its own errors
+            store.store_file(cur_file, target_path)
+            continue
         try:
             copyfile(cur_file, target_path)
         except OSError as e:
             print(f'ERROR: Unable to copy {cur_file} to {target_path} ({e.strerror})')
+
+    if (store is not None):
+        store.print_stats()
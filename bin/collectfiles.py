@@ -1,7 +1,7 @@
 import argparse # for argument parsing
 import os # for path commands
-import glob # for recursive file finding
 
+from file_walker import find_files # for recursive file finding
 from file_utilities import verify_directory, load_text_file, copy_file, FileUtilitiesConstants # for my file methods
 from pathlib import Path # unlink
 
@@ -127,9 +127,7 @@ if __name__ == "__main__":
         quit()
 
     # find all files in source dir
-    searchspec = os.path.join(args.source, '**')
-    searchspec = os.path.join(searchspec, '*')
-    filelist = glob.glob(searchspec, recursive=True)
+    filelist = list(find_files(args.source))
 
     # locate matching files and copy them to target
     for cur_line in file_lines:
@@ -8,14 +8,26 @@
 # You can optionally run greperrors inside individual target directories to generate files that extract
 # errors/failures/exceptions into separate files, or run 'logerrors' to generate those files in all
 # directories under /nfs/site/proj/simics/users/jlmayfie/logs (or your current target directory).
+#
+# Files are copied by a pool of --threads worker threads, since most of the time goes to waiting on NFS writes.
+# Large files are copied in the kernel. Use --link to hardlink or reflink files instead when the target is on
+# the same filesystem as the source (only safe if the tests won't rewrite those files in place).
+#
+# Use --dedup to keep each distinct file once in a content-addressed store (<target>/.objects) and hardlink it
+# into the run directories, or with --manifest, list it in each run's dedup_manifest.json (see dedup_store.py).
 
 import argparse # argument parsing
-import glob # recursive file search
 import os # path functions
 import datetime # fromtimestamp
 import subprocess # Popen
+import time # copy throughput
+import concurrent.futures # ThreadPoolExecutor
 
-from shutil import copyfile
+from file_utilities import fast_copy_file, FileUtilitiesConstants # kernel copies and links
+from dedup_store import DedupStore, get_default_store # --dedup object store
+from log_scanner import scan_log # summary block scanner
+from file_walker import find_files # recursive scandir search
+from log_open import get_log_names # compressed log names
 
 STYLE_OS = 0
 STYLE_LINUX = 1
@@ -43,6 +55,12 @@ def parse_args():
     parser.add_argument('dir', type=str, help='Directory containing test logs (searched recursively).')
     parser.add_argument('-t', '--target', type=str, default="/nfs/site/proj/simics/users/jlmayfie/logs", help='Directory to copy test results to.')
     parser.add_argument('-r', '--reset', action='store_true', help='Reset test directories (deletes all "test.log" files under dir).')
+    parser.add_argument('-j', '--threads', type=int, default=8, help='Number of files to copy at once. Default is 8.')
+    parser.add_argument('--link', type=str, default=FileUtilitiesConstants.LINK_NONE,
+                        choices=[FileUtilitiesConstants.LINK_NONE, FileUtilitiesConstants.LINK_HARDLINK, FileUtilitiesConstants.LINK_REFLINK],
+                        help='Hardlink or reflink files instead of copying when source and target share a filesystem (falls back to copying). Default is none.')
+    parser.add_argument('--dedup', action='store_true', help='Store each distinct file once under <target>/.objects and hardlink it into the run directories.')
+    parser.add_argument('--manifest', action='store_true', help='With --dedup, list stored files in each run\'s dedup_manifest.json instead of hardlinking them.')
     args = parser.parse_args()
     return args
 
@@ -63,43 +81,6 @@ def get_git_branch(curpath):
 
     return (success, curbranch)
 
-def tail(filename, lines=10):
-    # adapted from: https://stackoverflow.com/questions/136168/get-last-n-lines-of-a-file-similar-to-tail
-
-    if lines == 0:
-        print("ERROR: Must specify at least 1 line to return.")
-        return []
-
-    f = open(filename, "rb")
-
-    BUFSIZ = 1024
-    f.seek(0, 2)
-    remaining_bytes = f.tell()
-    size = lines + 1
-    block = -1
-    data = []
-
-    while size > 0 and remaining_bytes > 0:
-        if remaining_bytes - BUFSIZ > 0:
-            # Seek back one whole BUFSIZ
-            f.seek(block * BUFSIZ, 2)
-            # read BUFFER
-            bunch = f.read(BUFSIZ)
-        else:
-            # file too small, start from beginning
-            f.seek(0, 0)
-            # only read what was not read
-            bunch = f.read(remaining_bytes)
-
-        bunch = bunch.decode('utf-8')
-        data.insert(0, bunch)
-        size -= bunch.count('\n')
-        remaining_bytes -= BUFSIZ
-        block -= 1
-
-    f.close()
-    return ''.join(data).splitlines()[-lines:]
-
 def find_test_logs(dir, filename = "test.log"):
     foundfiles = []
     # confirm directory exists
@@ -108,9 +89,7 @@ def find_test_logs(dir, filename = "test.log"):
         return foundfiles
 
     # do recursive search for files matching filename
-    searchspec = os.path.join(dir, '**')
-    searchspec = os.path.join(searchspec, filename)
-    foundfiles = glob.glob(searchspec, recursive=True)
+    foundfiles = list(find_files(dir, get_log_names(filename)))
 
     # return list of filenames
     return foundfiles
@@ -185,13 +164,15 @@ def extract_result(filename, tail_lines, branchname):
 
 # TODO - major overhaul; this should copy log results to appropriately-named directories rather than parse
 #        log output and return results
-def collect_logs(filelist, target, branchname):
+def collect_logs(filelist, target, branchname, threads = 8, link_mode = FileUtilitiesConstants.LINK_NONE, store = None):
     logs_processed = 0
+    copy_jobs = []
 
     # collect test results (at end of file)
     for curfile in filelist:
         # print(f"FILE: {curfile}")
-        curlines = tail(curfile)
+        # only the summary block is needed here; skip the run_target search
+        target_lines, curlines = scan_log(curfile, want_targets=False)
         TestResult.RESULT_ERROR
         testname = ""
         curresult, testname = extract_result(curfile, curlines, branchname)
@@ -209,17 +190,44 @@ def collect_logs(filelist, target, branchname):
             sourcedir = os.path.dirname(curfile)
             # print(f"sourcedir: {sourcedir}")
 
-            # copy source contents to target
-            print(f"Copying files from {sourcedir}...")
-            filenames = [f for f in os.listdir(sourcedir) if os.path.isfile(os.path.join(sourcedir, f))]
-            for cursource in filenames:
-                sourcefile = os.path.join(sourcedir, cursource)
-                if os.path.isfile(sourcefile):
-                    targetfile = os.path.join(target_path, cursource)
-                    copyfile(sourcefile, targetfile)
+            # queue source contents to copy to target
+            print(f"Queueing files from {sourcedir}...")
+            for entry in os.scandir(sourcedir):
+                if entry.is_file():
+                    copy_jobs.append((entry.path, os.path.join(target_path, entry.name)))
 
+    copy_files(copy_jobs, threads, link_mode, store)
     return logs_processed
 
+# store is a DedupStore, or None to copy files directly
+def copy_files(copy_jobs, threads, link_mode, store = None):
+    copied = 0
+    errors = 0
+    total_bytes = 0
+    print(f"Copying {len(copy_jobs)} files with {threads} threads...")
+    start_time = time.monotonic()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, threads)) as executor:
+        if (store is not None):
+            futures = [executor.submit(store.store_file, sourcefile, targetfile) for sourcefile, targetfile in copy_jobs]
+        else:
+            futures = [executor.submit(fast_copy_file, sourcefile, targetfile, link_mode) for sourcefile, targetfile in copy_jobs]
+        for future in concurrent.futures.as_completed(futures):
+            result, size = future.result()
+            if (result == FileUtilitiesConstants.RESULT_COPIED):
+                copied += 1
+                total_bytes += size
+            else:
+                errors += 1
+    elapsed = max(time.monotonic() - start_time, 0.001)
+
+    megabytes = total_bytes / (1024 * 1024)
+    print(f"Copied {copied} files ({megabytes:.1f} MB) in {elapsed:.1f} seconds ({megabytes / elapsed:.1f} MB/s).")
+    if (errors > 0):
+        print(f"WARNING: {errors} files could not be copied.")
+    if (store is not None):
+        store.write_manifests()
+        store.print_stats()
+
 
 if __name__ == "__main__":
     args = parse_args()
@@ -249,4 +257,7 @@ if __name__ == "__main__":
             os.remove(cur_file)
     else:
         # get details for all tests
-        results = collect_logs(found_logs, args.target, curbranch)
+        store = None
+        if (args.dedup):
+            store = DedupStore(get_default_store(args.target), args.manifest)
+        results = collect_logs(found_logs, args.target, curbranch, args.threads, args.link, store)
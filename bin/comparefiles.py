@@ -5,78 +5,90 @@
 # - Lines unique to the second file.
 # - Lines common to both files.
 #
-# You can optionally sort the resulting lists in alphabetical order.
+# You can optionally sort the resulting lists in alphabetical order, and show how many times
+# each line occurs in each file (--counts).
 #
-# If using this with Simics test logs, you might want to run nostamps.py on the log files
-# first, to remove timestamps that can make meaningful comparison difficult.
+# If using this with Simics test logs, use --nostamps to remove timestamps (the nostamps.py formats)
+# before comparing, since they make meaningful comparison difficult.
+#
+# For files too big to fit in memory, use --stream. Lines are partitioned into temporary bucket files
+# by hash and each pair of buckets is compared separately, so only one bucket is in memory at a time.
+# Results are then grouped by bucket, and --sort applies within each bucket.
+#
+# Use --ordered for an order-aware diff instead, printed as unified diff hunks. Lines are compared with
+# timestamps removed, so two Simics test logs can be diffed without timestamp noise (see log_diff.py).
+#
+# gzip, xz and bz2 compressed files are decompressed on the fly.
 
 import argparse # argument parsing
+import os # path functions
+import shutil # copyfileobj
+import sys # stdout
+import tempfile # --stream bucket files
+import zlib # crc32 for bucketing
+from collections import Counter # line multisets
+
+from log_open import open_log_text # plain or compressed files, encoding detection
+from nostamps import strip_timestamps # --nostamps
+from log_diff import hash_lines, unified_diff # --ordered
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Compares two text files and prints the results.")
     parser.add_argument('file1', type=str, help='First text file.')
     parser.add_argument('file2', type=str, help='Second text file.')
     parser.add_argument('-s', '--sort', action='store_true', help='Sort comparison results before printing.')
+    parser.add_argument('-c', '--counts', action='store_true', help='Show how many times each line occurs in each file.')
+    parser.add_argument('-n', '--nostamps', action='store_true', help='Remove timestamps from lines before comparing them.')
+    parser.add_argument('--stream', action='store_true', help='Compare files larger than memory by partitioning lines into temporary buckets.')
+    parser.add_argument('--buckets', type=int, default=64, help='Number of buckets to use with --stream. Default is 64.')
+    parser.add_argument('-o', '--ordered', action='store_true', help='Print an ordered unified diff (ignoring timestamps) instead of the three line lists.')
+    parser.add_argument('-U', '--context', type=int, default=3, help='Lines of context around each --ordered hunk. Default is 3.')
     args = parser.parse_args()
     return args
 
-def open_attempt(filename, enc_type):
-    try:
-        f = open(filename, mode='r', encoding=enc_type)
-        line = f.readline()
-    except:
-        # file didn't open, fail out
-        return False
-
-    # if we're here it succeeded
-    f.close()
-    return True
-
-def get_encoding_type(filename):
-    if open_attempt(filename, 'utf_16'):
-        return 'utf_16'
-    if open_attempt(filename, 'utf-8'):
-        return 'utf_8'
-    if open_attempt(filename, 'ascii'):
-        return 'ascii'
-
-    # if we're here, we don't know the type
-    return 'undefined'
-
-def get_file_lines(filename):
-    lines = []
-
-    enc_type = get_encoding_type(filename)
-    if (enc_type == 'undefined'):
+def iter_file_lines(filename, normalize = False):
+    file, enc_type = open_log_text(filename)
+    if (file is None):
         print(f"ERROR: Unable to determine encoding of {filename}!")
-        return lines
-
-    with open(filename, 'r', encoding=enc_type) as file:
-        line = file.readline()
-        while line:
-            lines.append(line.strip())
-            line = file.readline()
-        file.close()
-    
-    return lines
-
-def compare_lines(lines1, lines2, sort):
-    file1_lines = []
-    file2_lines = []
-    common_lines = []
-
-    for cur_line in lines1:
-        if cur_line in lines2:
-            if (cur_line not in common_lines):
-                common_lines.append(cur_line)
-        else:
-            if (cur_line not in file1_lines):
-                file1_lines.append(cur_line)
-    
-    for cur_line in lines2:
-        if not cur_line in lines1:
-            if (cur_line not in file2_lines):
-                file2_lines.append(cur_line)
+        return
+
+    with file:
+        for line in file:
+            if (normalize):
+                line = strip_timestamps(line)
+            yield line.strip()
+
+def iter_raw_lines(filename):
+    file, enc_type = open_log_text(filename)
+    if (file is None):
+        return
+    with file:
+        for line in file:
+            yield line.rstrip("\r\n")
+
+def compare_ordered(file1, file2, context):
+    # normalize and hash both files first; the original lines are only read again for the hunks
+    hashes1 = hash_lines(iter_file_lines(file1, True))
+    hashes2 = hash_lines(iter_file_lines(file2, True))
+    print(f"Lines: {len(hashes1)} / {len(hashes2)}")
+    print("")
+    num_lines = 0
+    for cur_line in unified_diff(hashes1, hashes2, iter_raw_lines(file1), iter_raw_lines(file2), file1, file2, context):
+        sys.stdout.write(cur_line + "\n")
+        num_lines += 1
+    if (num_lines == 0):
+        print("No differences (ignoring timestamps).")
+
+# Returns a Counter of the (stripped) lines in filename, in order of first appearance
+def get_line_counts(filename, normalize = False):
+    return Counter(iter_file_lines(filename, normalize))
+
+# Takes the line Counters of both files. Each line is listed once, in order of
+# first appearance (or sorted).
+def compare_lines(counts1, counts2, sort):
+    file1_lines = [cur_line for cur_line in counts1 if cur_line not in counts2]
+    file2_lines = [cur_line for cur_line in counts2 if cur_line not in counts1]
+    common_lines = [cur_line for cur_line in counts1 if cur_line in counts2]
 
     if sort:
         file1_lines = sorted(file1_lines)
@@ -92,35 +104,108 @@ def print_header(string_to_print):
     print(string_to_print)
     print(border_line)
 
+def format_line(cur_line, count1, count2, show_counts):
+    if (not show_counts):
+        return cur_line
+    if (count2 == 0):
+        return f"{count1}: {cur_line}"
+    if (count1 == 0):
+        return f"{count2}: {cur_line}"
+    return f"{count1}/{count2}: {cur_line}"
+
+# writes the three result sections for one pair of Counters to the given outputs
+def write_comparison(counts1, counts2, sort, show_counts, outputs):
+    file1_lines, file2_lines, common_lines = compare_lines(counts1, counts2, sort)
+    for cur_line in file1_lines:
+        outputs[0].write(format_line(cur_line, counts1[cur_line], 0, show_counts) + "\n")
+    for cur_line in file2_lines:
+        outputs[1].write(format_line(cur_line, 0, counts2[cur_line], show_counts) + "\n")
+    for cur_line in common_lines:
+        outputs[2].write(format_line(cur_line, counts1[cur_line], counts2[cur_line], show_counts) + "\n")
+
+# Splits filename's lines into num_buckets files by hash, so identical lines
+# from both files land in buckets with the same index. Returns the line count.
+def partition_file(filename, normalize, bucket_paths):
+    num_lines = 0
+    buckets = [open(cur_path, 'w', encoding='utf-8', errors='surrogateescape') for cur_path in bucket_paths]
+    try:
+        for cur_line in iter_file_lines(filename, normalize):
+            data = cur_line.encode('utf-8', errors='surrogateescape')
+            buckets[zlib.crc32(data) % len(buckets)].write(cur_line + "\n")
+            num_lines += 1
+    finally:
+        for cur_bucket in buckets:
+            cur_bucket.close()
+    return num_lines
+
+def load_bucket(bucket_path):
+    with open(bucket_path, 'r', encoding='utf-8', errors='surrogateescape', newline='\n') as f:
+        return Counter(cur_line[:-1] for cur_line in f)
+
+def compare_streaming(file1, file2, sort, show_counts, normalize, num_buckets):
+    num_buckets = max(1, num_buckets)
+    with tempfile.TemporaryDirectory(prefix="comparefiles-") as temp_dir:
+        bucket_paths1 = [os.path.join(temp_dir, f"a{index}") for index in range(num_buckets)]
+        bucket_paths2 = [os.path.join(temp_dir, f"b{index}") for index in range(num_buckets)]
+        if (partition_file(file1, normalize, bucket_paths1) == 0):
+            print(f"ERROR: No content in {file1}.")
+            return
+        if (partition_file(file2, normalize, bucket_paths2) == 0):
+            print(f"ERROR: No content in {file2}.")
+            return
+
+        section_paths = [os.path.join(temp_dir, name) for name in ("only1", "only2", "common")]
+        outputs = [open(cur_path, 'w', encoding='utf-8', errors='surrogateescape') for cur_path in section_paths]
+        try:
+            for index in range(num_buckets):
+                write_comparison(load_bucket(bucket_paths1[index]), load_bucket(bucket_paths2[index]), sort, show_counts, outputs)
+                os.remove(bucket_paths1[index])
+                os.remove(bucket_paths2[index])
+        finally:
+            for cur_output in outputs:
+                cur_output.close()
+
+        titles = [f"LINES ONLY IN {file1}", f"LINES ONLY IN {file2}", "LINES IN BOTH FILES"]
+        for title, cur_path in zip(titles, section_paths):
+            print_header(title)
+            sys.stdout.flush()
+            with open(cur_path, 'r', encoding='utf-8', errors='surrogateescape') as f:
+                shutil.copyfileobj(f, sys.stdout)
+
 if __name__ == "__main__":
-    file1_lines = []
-    file2_lines = []
-    common_lines = []
     args = parse_args()
 
     print(f" First file: {args.file1}")
     print(f"Second file: {args.file2}")
 
-    file1_lines = get_file_lines(args.file1)
-    if (len(file1_lines) == 0):
+    if (args.ordered):
+        compare_ordered(args.file1, args.file2, args.context)
+        quit()
+
+    if (args.stream):
+        compare_streaming(args.file1, args.file2, args.sort, args.counts, args.nostamps, args.buckets)
+        quit()
+
+    counts1 = get_line_counts(args.file1, args.nostamps)
+    if (len(counts1) == 0):
         print(f"ERROR: No content in {args.file1}.")
         quit()
 
-    file2_lines = get_file_lines(args.file2)
-    if (len(file2_lines) == 0):
+    counts2 = get_line_counts(args.file2, args.nostamps)
+    if (len(counts2) == 0):
         print(f"ERROR: No content in {args.file2}.")
         quit()
 
-    file1_lines, file2_lines, common_lines = compare_lines(file1_lines, file2_lines, args.sort)
+    file1_lines, file2_lines, common_lines = compare_lines(counts1, counts2, args.sort)
 
     print_header(f"LINES ONLY IN {args.file1}")
     for cur_line in file1_lines:
-        print(cur_line)
+        print(format_line(cur_line, counts1[cur_line], 0, args.counts))
 
     print_header(f"LINES ONLY IN {args.file2}")
     for cur_line in file2_lines:
-        print(cur_line)
+        print(format_line(cur_line, 0, counts2[cur_line], args.counts))
     
     print_header("LINES IN BOTH FILES")
     for cur_line in common_lines:
-        print(cur_line)
+        print(format_line(cur_line, counts1[cur_line], counts2[cur_line], args.counts))
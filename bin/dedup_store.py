@@ -0,0 +1,174 @@
+#!/usr/intel/bin/python3.12.3
+
+# Content-addressed store for collected test files. Each file is hashed (SHA-256, while it's copied) and kept once under
+# <target>/.objects/<first two hex digits>/<hash>. Run directories then get either a hardlink to the object or,
+# in manifest mode, an entry in their dedup_manifest.json. Configs, setup logs and binaries that don't change
+# between runs are only stored once, no matter how many times they're collected.
+#
+# collecttests.py and collectdefaults.py use this with --dedup. Run this script on a manifest-mode run directory
+# to turn its manifest back into real files (hardlinks to the objects, or copies with --copy).
+
+import argparse # argument parsing
+import hashlib # sha256
+import json # manifests
+import os # path functions
+import shutil # copyfile for --copy restores
+import stat # read-only object permissions
+import tempfile # atomic object writes
+import threading # store is shared by copy threads
+
+from file_utilities import FileUtilitiesConstants # RESULT_ values
+
+OBJECTS_DIRNAME = ".objects"
+MANIFEST_FILENAME = "dedup_manifest.json"
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Copies source to the open file target while hashing it, so the digest is of
+# exactly the bytes written. Returns (hex digest, size).
+def copy_and_hash(source_path, target):
+    # hashlib releases the GIL on large updates, so hashing in several threads runs in parallel
+    digest = hashlib.sha256()
+    size = 0
+    with open(source_path, "rb") as f:
+        while True:
+            chunk = f.read(HASH_CHUNK_SIZE)
+            if (len(chunk) == 0):
+                break
+            digest.update(chunk)
+            target.write(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+def get_default_store(target_dir):
+    return os.path.join(target_dir, OBJECTS_DIRNAME)
+
+class DedupStore:
+    def __init__(self, root, use_manifest = False):
+        self.root = root
+        self.use_manifest = use_manifest
+        self.lock = threading.Lock()
+        # run directory -> {filename: {"sha256", "size"}}, for manifest mode
+        self.manifests = {}
+        self.new_objects = 0
+        self.new_bytes = 0
+        self.reused_objects = 0
+        self.reused_bytes = 0
+        os.makedirs(root, exist_ok=True)
+
+    def get_object_path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    # Copies source into the store unless an identical object is already there;
+    # returns (object path, digest, size, True if it was new). The source is read
+    # once, hashed as it's copied to a temp file, and the temp file is linked in
+    # under the digest of what was actually copied, so a file that changes while
+    # it's being stored can't leave an object that doesn't match its name.
+    def add_object(self, source_path):
+        # the temp file is in the store root so it can be linked into any object directory
+        fd, temp_path = tempfile.mkstemp(dir=self.root, prefix=".tmp-")
+        is_new = True
+        try:
+            with os.fdopen(fd, "wb") as temp_file:
+                digest, size = copy_and_hash(source_path, temp_file)
+            object_path = self.get_object_path(digest)
+            if (os.path.exists(object_path)):
+                return object_path, digest, size, False
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            # objects are shared by every run that links to them; don't let one run edit them
+            os.chmod(temp_path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+            # linking means a half-written object is never visible to other threads or runs. If another
+            # thread stored the same content first, the link fails and theirs is kept.
+            try:
+                os.link(temp_path, object_path)
+            except FileExistsError:
+                is_new = False
+        finally:
+            os.unlink(temp_path)
+        return object_path, digest, size, is_new
+
+    # Stores one file and puts it (or its manifest entry) at target_path.
+    # Returns (result, bytes written to the store), like fast_copy_file.
+    def store_file(self, source_path, target_path):
+        try:
+            object_path, digest, size, is_new = self.add_object(source_path)
+            target_dir = os.path.dirname(target_path)
+            os.makedirs(target_dir, exist_ok=True)
+            if (self.use_manifest):
+                with self.lock:
+                    self.manifests.setdefault(target_dir, {})[os.path.basename(target_path)] = {"sha256" : digest, "size" : size}
+            else:
+                if (os.path.lexists(target_path)):
+                    os.unlink(target_path)
+                os.link(object_path, target_path)
+        except OSError as e:
+            print(f'ERROR: Unable to store file {source_path} ({e.strerror})')
+            return FileUtilitiesConstants.RESULT_ERROR, 0
+
+        with self.lock:
+            if (is_new):
+                self.new_objects += 1
+                self.new_bytes += size
+            else:
+                self.reused_objects += 1
+                self.reused_bytes += size
+        return FileUtilitiesConstants.RESULT_COPIED, (size if is_new else 0)
+
+    # writes the manifest of each run directory touched in manifest mode
+    def write_manifests(self):
+        for run_dir, entries in self.manifests.items():
+            manifest = load_manifest(run_dir)
+            manifest.update(entries)
+            with open(os.path.join(run_dir, MANIFEST_FILENAME), "w") as f:
+                json.dump(manifest, f, indent = 4, sort_keys=True)
+        self.manifests = {}
+
+    def print_stats(self):
+        megabytes = self.reused_bytes / (1024 * 1024)
+        print(f"Dedup store {self.root}: {self.new_objects} new objects, {self.reused_objects} files already stored ({megabytes:.1f} MB not copied).")
+
+def load_manifest(run_dir):
+    manifest_path = os.path.join(run_dir, MANIFEST_FILENAME)
+    if (not os.path.isfile(manifest_path)):
+        return {}
+    with open(manifest_path, "r") as f:
+        return json.load(f)
+
+# Recreates the files listed in run_dir's manifest. Returns the number of files restored.
+def restore_manifest(run_dir, store_root, copy = False):
+    store = DedupStore(store_root)
+    restored = 0
+    for name, entry in load_manifest(run_dir).items():
+        object_path = store.get_object_path(entry["sha256"])
+        target_path = os.path.join(run_dir, name)
+        try:
+            if (os.path.lexists(target_path)):
+                os.unlink(target_path)
+            if (copy):
+                shutil.copyfile(object_path, target_path)
+            else:
+                os.link(object_path, target_path)
+            restored += 1
+        except OSError as e:
+            print(f"ERROR: Unable to restore {target_path} from {object_path} ({e.strerror})")
+    return restored
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Restores the files listed in a dedup_manifest.json from the content-addressed store.")
+    parser.add_argument('run_dir', type=str, help='Collected run directory containing a dedup_manifest.json.')
+    parser.add_argument('-s', '--store', type=str, default=None, help='Object store directory. Default is .objects in the parent of run_dir.')
+    parser.add_argument('-c', '--copy', action='store_true', help='Copy objects instead of hardlinking them (use if you intend to edit the files).')
+    args = parser.parse_args()
+    return args
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    store_root = args.store
+    if (store_root is None):
+        store_root = get_default_store(os.path.dirname(os.path.abspath(args.run_dir)))
+    if (not os.path.isdir(store_root)):
+        print(f"ERROR: Object store {store_root} does not exist.")
+        quit()
+
+    restored = restore_manifest(args.run_dir, store_root, args.copy)
+    print(f"Restored {restored} files in {args.run_dir}.")
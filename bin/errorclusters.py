@@ -0,0 +1,133 @@
+#!/usr/intel/bin/python3.12.3
+
+# This script clusters the error/fail/exception/traceback lines (the same lines greperrors extracts) from the
+# logs of one or more test runs. Each line is turned into a template by removing timestamps and masking paths,
+# hex values and numbers (see log_templates.py), so lines that only differ in addresses or counters are counted
+# together. For each run it prints the most common templates, with an example of the original line.
+#
+# - Each run is a directory; all *.log files under it (including compressed ones) are read.
+# - Use --baseline to also list, for each run, the templates that never appear in the baseline run.
+# - Use --num-templates to set how many templates to print per run.
+# - Use --jobs to read logs in parallel worker processes.
+
+import argparse # argument parsing
+import concurrent.futures # ProcessPoolExecutor
+import os # path functions
+import re # error line matching
+from collections import Counter # template counts
+
+from file_walker import find_files # recursive scandir search
+from log_open import open_log, get_log_names # plain or compressed logs
+from log_templates import make_template, get_fingerprint # line templates
+
+ERROR_PATTERN = re.compile(r"error|fail|exception|traceback", re.IGNORECASE)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Clusters error lines from test logs into templates and reports the most common ones per run.")
+    parser.add_argument('runs', type=str, nargs='+', help='Run directories to search (recursively) for *.log files.')
+    parser.add_argument('-b', '--baseline', type=str, default=None, help='Baseline run directory. Templates not seen in the baseline are reported as new.')
+    parser.add_argument('-n', '--num-templates', type=int, default=20, help='Number of templates to print per run. Default is 20.')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='Number of worker processes used to read logs. Default is the CPU count.')
+    args = parser.parse_args()
+    return args
+
+def find_logs(run_dir):
+    if (not os.path.isdir(run_dir)):
+        print(f"ERROR: {run_dir} does not exist or is not a directory!")
+        return []
+    return sorted(find_files(run_dir, get_log_names("*.log")))
+
+# Reads one log and returns (fingerprint counts, fingerprint -> (template,
+# example line), error). Runs in worker processes, so it never raises.
+def cluster_log(filename):
+    counts = Counter()
+    examples = {}
+    try:
+        with open_log(filename, "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                if (ERROR_PATTERN.search(line) is None):
+                    continue
+                template = make_template(line)
+                fingerprint = get_fingerprint(template)
+                counts[fingerprint] += 1
+                if (fingerprint not in examples):
+                    examples[fingerprint] = (template, line.strip())
+    except Exception as e:
+        return counts, examples, repr(e)
+    return counts, examples, None
+
+class RunClusters:
+    def __init__(self, run_dir):
+        self.run_dir = run_dir
+        self.counts = Counter()
+        self.examples = {}
+        self.logs = 0
+
+    def add(self, counts, examples):
+        self.logs += 1
+        self.counts.update(counts)
+        for fingerprint, example in examples.items():
+            self.examples.setdefault(fingerprint, example)
+
+# Reads every log of every run in one pass through a process pool. Returns a
+# RunClusters per run, in the same order.
+def cluster_runs(run_dirs, jobs):
+    runs = [RunClusters(cur_dir) for cur_dir in run_dirs]
+    jobs_list = []
+    for run_idx, cur_dir in enumerate(run_dirs):
+        for cur_log in find_logs(cur_dir):
+            jobs_list.append((run_idx, cur_log))
+    filelist = [cur_log for run_idx, cur_log in jobs_list]
+    print(f"Reading {len(filelist)} logs from {len(run_dirs)} runs...")
+
+    if (jobs is None) or (jobs <= 1) or (len(filelist) <= 1):
+        results = map(cluster_log, filelist)
+        executor = None
+    else:
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=jobs)
+        results = executor.map(cluster_log, filelist, chunksize=max(1, len(filelist) // (jobs * 8)))
+
+    for (run_idx, cur_log), (counts, examples, error) in zip(jobs_list, results):
+        if (error is not None):
+            print(f"ERROR: Unable to read {cur_log}: {error}")
+            continue
+        runs[run_idx].add(counts, examples)
+
+    if (executor is not None):
+        executor.shutdown()
+    print("")
+    return runs
+
+def print_templates(title, run, fingerprints, max_num):
+    print(f"{title}:")
+    if (len(fingerprints) == 0):
+        print("- (none)")
+    for fingerprint in fingerprints[:max_num]:
+        template, example = run.examples[fingerprint]
+        print(f"- {run.counts[fingerprint]} x {template}")
+        print(f"  e.g. {example}")
+    if (len(fingerprints) > max_num):
+        print(f"- ... and {len(fingerprints) - max_num} more")
+    print("")
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    run_dirs = list(args.runs)
+    if (args.baseline is not None):
+        run_dirs.append(args.baseline)
+    runs = cluster_runs(run_dirs, args.jobs)
+    baseline = None
+    if (args.baseline is not None):
+        baseline = runs.pop()
+        print(f"Baseline {baseline.run_dir}: {baseline.logs} logs, {sum(baseline.counts.values())} error lines, {len(baseline.counts)} templates")
+        print("")
+
+    for cur_run in runs:
+        print(f"Run {cur_run.run_dir}: {cur_run.logs} logs, {sum(cur_run.counts.values())} error lines, {len(cur_run.counts)} templates")
+        print("")
+        top = [fingerprint for fingerprint, count in cur_run.counts.most_common()]
+        print_templates("Most common templates", cur_run, top, args.num_templates)
+        if (baseline is not None):
+            new = [fingerprint for fingerprint in top if fingerprint not in baseline.counts]
+            print_templates(f"Templates not in baseline {baseline.run_dir}", cur_run, new, args.num_templates)
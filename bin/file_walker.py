@@ -0,0 +1,147 @@
+import os # for scandir
+import fnmatch # for wildcard name matching
+import concurrent.futures # for threaded subtree scans
+
+# Recursive file finder built on os.scandir. Replaces
+# glob.glob(os.path.join(dir, '**', name), recursive=True): results are yielded
+# as they're found instead of being collected into a list first, and the
+# directory entry type from scandir is used instead of a stat per path.
+#
+# Like glob, names starting with "." are skipped unless include_hidden is set,
+# and symlinked directories are followed.
+
+WILDCARD_CHARS = "*?["
+
+def has_wildcard(pattern):
+    return any(c in pattern for c in WILDCARD_CHARS)
+
+class NameMatcher:
+    # names can be a single name/pattern, a list of them, or None to match everything
+    def __init__(self, names):
+        self.match_all = False
+        self.exact = set()
+        self.patterns = []
+        if (names is None):
+            self.match_all = True
+            return
+        if isinstance(names, str):
+            names = [names]
+        for cur_name in names:
+            if (cur_name == "*"):
+                self.match_all = True
+            elif has_wildcard(cur_name):
+                self.patterns.append(os.path.normcase(cur_name))
+            else:
+                self.exact.add(os.path.normcase(cur_name))
+
+    def matches(self, name):
+        if (self.match_all):
+            return True
+        name = os.path.normcase(name)
+        if (name in self.exact):
+            return True
+        for cur_pattern in self.patterns:
+            if fnmatch.fnmatchcase(name, cur_pattern):
+                return True
+        return False
+
+class PruneMatcher:
+    # Patterns without a separator (".git", "obj*") match a directory's own
+    # name. Patterns with one ("linux64/obj") match the end of the directory's
+    # path relative to the search root, always written with "/".
+    def __init__(self, patterns):
+        self.path_patterns = []
+        if (patterns is None):
+            patterns = []
+        elif isinstance(patterns, str):
+            patterns = [patterns]
+        name_list = []
+        for cur_pattern in patterns:
+            cur_pattern = cur_pattern.replace("\\", "/").strip("/")
+            if ("/" in cur_pattern):
+                self.path_patterns.append(os.path.normcase(cur_pattern))
+            else:
+                name_list.append(cur_pattern)
+        self.name_patterns = NameMatcher(name_list)
+
+    def matches(self, name, rel_path):
+        if self.name_patterns.matches(name):
+            return True
+        if (len(self.path_patterns) > 0):
+            rel_path = os.path.normcase(rel_path.replace(os.path.sep, "/"))
+            for cur_pattern in self.path_patterns:
+                if fnmatch.fnmatchcase(rel_path, cur_pattern) or fnmatch.fnmatchcase(rel_path, "*/" + cur_pattern):
+                    return True
+        return False
+
+def walk_tree(top, rel_top, depth, names, prune, max_depth, include_dirs, include_hidden):
+    # unreadable directories are skipped silently, the same as glob
+    try:
+        entries = list(os.scandir(top))
+    except OSError:
+        return
+
+    for entry in entries:
+        if (not include_hidden) and entry.name.startswith("."):
+            continue
+        try:
+            is_dir = entry.is_dir()
+        except OSError:
+            continue
+        if (is_dir):
+            rel_path = entry.name if (rel_top == "") else rel_top + "/" + entry.name
+            if prune.matches(entry.name, rel_path):
+                continue
+            if (include_dirs) and names.matches(entry.name):
+                yield entry.path
+            if (max_depth is None) or (depth < max_depth):
+                yield from walk_tree(entry.path, rel_path, depth + 1, names, prune, max_depth, include_dirs, include_hidden)
+        elif names.matches(entry.name):
+            yield entry.path
+
+# Yields paths under top whose file name matches names (an exact name, an
+# fnmatch pattern, a list of either, or None for everything).
+# - prune: directory names or relative path patterns not to descend into.
+# - max_depth: number of directory levels below top to search (0 = top only,
+#   None = unlimited).
+# - include_dirs: also yield matching directories.
+# - threads: if greater than 1, each top-level subdirectory is scanned in its
+#   own worker thread, which hides latency on NFS. Results then come back one
+#   subtree at a time, in completion order.
+def find_files(top, names=None, prune=None, max_depth=None, include_dirs=False, include_hidden=False, threads=0):
+    names = NameMatcher(names)
+    prune = PruneMatcher(prune)
+
+    if (threads is None) or (threads <= 1) or ((max_depth is not None) and (max_depth < 1)):
+        yield from walk_tree(top, "", 0, names, prune, max_depth, include_dirs, include_hidden)
+        return
+
+    # scan the top level here, and hand each subdirectory to a worker
+    subdirs = []
+    try:
+        entries = list(os.scandir(top))
+    except OSError:
+        entries = []
+    for entry in entries:
+        if (not include_hidden) and entry.name.startswith("."):
+            continue
+        try:
+            is_dir = entry.is_dir()
+        except OSError:
+            continue
+        if (is_dir):
+            if prune.matches(entry.name, entry.name):
+                continue
+            subdirs.append(entry)
+            if (include_dirs) and names.matches(entry.name):
+                yield entry.path
+        elif names.matches(entry.name):
+            yield entry.path
+
+    def scan_subtree(entry):
+        return list(walk_tree(entry.path, entry.name, 1, names, prune, max_depth, include_dirs, include_hidden))
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+        futures = [executor.submit(scan_subtree, cur_dir) for cur_dir in subdirs]
+        for future in concurrent.futures.as_completed(futures):
+            yield from future.result()
@@ -0,0 +1,203 @@
+import ctypes # inotify calls
+import ctypes.util # find_library
+import os # for scandir, stat
+import select # waiting on the inotify fd
+import struct # inotify event parsing
+import sys # platform check
+import time # debounce timing
+
+from file_walker import find_files, NameMatcher # recursive search and name matching
+
+# Watches a directory tree for files with the given names being created or
+# updated. On Linux this uses inotify (through ctypes, since there's no
+# standard module for it); elsewhere, or on NFS where inotify doesn't see
+# changes made by other hosts, it falls back to polling with scandir.
+#
+# Changes are debounced: a file is only reported once it has gone
+# settle_seconds without changing, so files that are still being written
+# aren't picked up half-way.
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+# struct inotify_event { int wd; uint32_t mask; uint32_t cookie; uint32_t len; char name[]; }
+EVENT_HEADER = struct.Struct("iIII")
+
+def get_file_stamp(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_size, stat.st_mtime_ns)
+
+class PollingWatcher:
+    def __init__(self, top, names, interval):
+        self.top = top
+        self.names = names
+        self.interval = interval
+        self.last_scan = 0.0
+        self.stamps = self.scan()
+        self.last_scan = time.monotonic()
+
+    def scan(self):
+        stamps = {}
+        for path in find_files(self.top, self.names):
+            stamp = get_file_stamp(path)
+            if (stamp is not None):
+                stamps[path] = stamp
+        return stamps
+
+    # returns the set of files that appeared or changed since the last scan
+    def poll(self, timeout):
+        wait = self.last_scan + self.interval - time.monotonic()
+        if (wait > timeout):
+            time.sleep(timeout)
+            return set()
+        if (wait > 0):
+            time.sleep(wait)
+        stamps = self.scan()
+        self.last_scan = time.monotonic()
+        changed = set(path for path, stamp in stamps.items() if self.stamps.get(path) != stamp)
+        self.stamps = stamps
+        return changed
+
+    def close(self):
+        pass
+
+class InotifyWatcher:
+    def __init__(self, top, names):
+        if (not sys.platform.startswith("linux")):
+            raise OSError("inotify is only available on Linux")
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if (self.fd < 0):
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"inotify_init1 failed: {os.strerror(errno)}")
+        self.top = top
+        self.names = names
+        self.matcher = NameMatcher(names)
+        self.watches = {}
+        try:
+            self.add_tree(top)
+        except OSError:
+            os.close(self.fd)
+            raise
+
+    def add_watch(self, path):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if (wd < 0):
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"Unable to watch {path}: {os.strerror(errno)}")
+        self.watches[wd] = path
+
+    # watches path and every directory below it; returns matching files
+    # already there (they may have been written before the watch existed)
+    def add_tree(self, path):
+        found = set()
+        self.add_watch(path)
+        try:
+            entries = list(os.scandir(path))
+        except OSError:
+            return found
+        for entry in entries:
+            if entry.name.startswith("."):
+                continue
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                continue
+            if (is_dir):
+                found |= self.add_tree(entry.path)
+            elif self.matcher.matches(entry.name):
+                found.add(entry.path)
+        return found
+
+    def poll(self, timeout):
+        changed = set()
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if (len(ready) == 0):
+            return changed
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return changed
+
+        offset = 0
+        while (offset < len(data)):
+            wd, mask, cookie, name_len = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + name_len].rstrip(b"\0"))
+            offset += name_len
+
+            if (mask & IN_Q_OVERFLOW):
+                # events were lost; treat every matching file as changed
+                changed |= set(find_files(self.top, self.names))
+                continue
+            if (mask & IN_IGNORED):
+                self.watches.pop(wd, None)
+                continue
+            parent = self.watches.get(wd)
+            if (parent is None) or (name == "") or name.startswith("."):
+                continue
+            path = os.path.join(parent, name)
+            if (mask & IN_ISDIR):
+                if (mask & (IN_CREATE | IN_MOVED_TO)):
+                    try:
+                        changed |= self.add_tree(path)
+                    except OSError as e:
+                        print(f"WARNING: {e}")
+            elif self.matcher.matches(name):
+                changed.add(path)
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+def create_watcher(top, names, interval, use_polling = False):
+    if (not use_polling):
+        try:
+            return InotifyWatcher(top, names)
+        except OSError as e:
+            print(f"INFO: inotify not available ({e}); polling every {interval} seconds instead.")
+    return PollingWatcher(top, names, interval)
+
+# Yields lists of files under top (matching names) that were created or
+# changed, once each has been left alone for settle_seconds. Runs until
+# interrupted.
+#
+# Each pending file's size and mtime are checked again before it's yielded,
+# since the polling watcher may not have rescanned during the settle time;
+# a file whose stamp changed goes back to waiting.
+def watch_files(top, names, settle_seconds = 10.0, interval = 30.0, use_polling = False):
+    watcher = create_watcher(top, names, interval, use_polling)
+    pending = {} # path -> (time of last change, stamp then)
+    try:
+        while True:
+            changed = watcher.poll(min(settle_seconds, interval) if (len(pending) > 0) else interval)
+            now = time.monotonic()
+            for path in changed:
+                pending[path] = (now, get_file_stamp(path))
+            ready = []
+            for path, (last_change, stamp) in sorted(pending.items()):
+                if ((now - last_change) < settle_seconds):
+                    continue
+                cur_stamp = get_file_stamp(path)
+                if (cur_stamp != stamp):
+                    pending[path] = (now, cur_stamp)
+                    continue
+                del pending[path]
+                if (cur_stamp is not None) and os.path.isfile(path):
+                    ready.append(path)
+            if (len(ready) > 0):
+                yield ready
+    finally:
+        watcher.close()
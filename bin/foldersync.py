@@ -1,8 +1,8 @@
 import argparse # for argument parsing
 import os # for path commands
 import shutil # for disk space commands
-import glob # for recursive file finding
 
+from file_walker import find_files # for recursive file finding
 from file_utilities import copy_newer_file, save_json_file, load_json_file, verify_directory, FileUtilitiesConstants, make_long_path # for my file methods
 from pathlib import Path # unlink
 
@@ -65,8 +65,7 @@ def sync_directories(settings_path, dry_run, debug_limit, prune, verbose):
             # method prints a warning if not able to create
             continue
         # build recursive search path for all files
-        searchspec = os.path.join(local_dir, "**", "*")
-        filelist = glob.iglob(searchspec, recursive = True)
+        filelist = find_files(local_dir)
         local_len = len(local_dir)
         # NOTE: This is to remove the pre-pended "\" that's left when you strip the local_dir from the total path.
         #       os.path.join removes the first directory from the second argument if the string begins with a "\" because
@@ -100,8 +99,8 @@ def sync_directories(settings_path, dry_run, debug_limit, prune, verbose):
         if (prune):
             # build recursive search path for all files
             print (f"Searching for potentially orphaned files in {remote_dir}. This might take a while...")
-            searchspec = os.path.join(remote_dir, "**", "*")
-            filelist = glob.iglob(searchspec, recursive = True)
+            # directories are needed too, so empty ones can be pruned afterwards
+            filelist = find_files(remote_dir, include_dirs=True)
             remote_len = len(remote_dir)
             remote_len += 1
             dirlist = []
@@ -4,22 +4,39 @@
 # fusegen XML files. At initial check-in it supports three use cases:
 # - Generate a worksheet that contains lockout value IDs for all fuses. ("default mode")
 # - Generate a text file that contains computed lockout values for arbitraty groups of fuses. ("compute mode")
+# - Generate a CSV/JSON matrix of lockout values for every SKU name file in a directory. ("sku mode")
 # - Generate a list of fuses/softstraps that use groups other than 0-3 for fuse & 4 for straps ("high_groups mode")
 # - Generate an editable fuse patch file based on a list of fuse names ("make_patch mode")
+# - Run high_groups/stats scans over a whole directory or glob of fusegen files in parallel ("--sources")
+# - Keep fusegen models loaded in a daemon that answers JSON requests over a UNIX socket ("serve mode").
+#   When a daemon is running, regular invocations forward their arguments to it instead of parsing
+#   the XML again. Use --no_daemon to always run locally.
 
 import xml.etree.cElementTree as etree
 
 import argparse
+import concurrent.futures
+import contextlib
+import glob
+import io
+import json
 import os
 import math
+import socket
+import sys
+import tempfile
 
 BYTE_BITS = 8
 INVALID_GROUP = -1
 DIRECT_FUSE = "DirectFuse"
 SOFT_STRAP = "SoftStrap"
 DWORD_BYTES = 4
+OVERRIDE_CFG_OUT = "config_out"
+OVERRIDE_DEFAULT_OVRD = "fuse_default_ovrd"
+POLICY_LAST_WINS = "last"
+POLICY_ERROR = "error"
 
-def parse_args():
+def parse_args(argv=None):
     parser = argparse.ArgumentParser(description="Lockbit dumper and computer")
     parser.add_argument('--source', metavar='source', type=str,
                         default = "fusegen.xml", required=False,
@@ -39,6 +56,13 @@ def parse_args():
                             'looks up the fuses by name and computes a single '
                             'combined bit flag value representing the LVID '
                             'bits of all found fuses.')
+    parser.add_argument('--sku_dir', metavar='sku_dir', type=str,
+                        default='', required=False,
+                        help='Directory of fuse name files, one per SKU. '
+                            'Computes the LVID value and combined width of '
+                            'every fuse category for every SKU in one pass '
+                            'and writes them to --target (CSV, or JSON if '
+                            'the target ends in .json).')
     parser.add_argument('--names_only', action='store_true', help='Causes '
                             'script to generate a "names file" containing '
                             'all the names of the fuses in this file instead'
@@ -112,18 +136,32 @@ def parse_args():
                         'is used. This lets us adopt new values in future '
                         'fuse releases without breaking fuses we know we '
                         'need to override.')
-    parser.add_argument('--config_out', metavar='config_out', type=str,
-                        default='', required=False,
+    # --config_out and --fuse_default_ovrd share one list so the files are
+    # applied in the order they were given on the command line
+    parser.add_argument('--config_out', metavar='config_out',
+                        type=lambda path: (OVERRIDE_CFG_OUT, path),
+                        dest='override_files', action='append', default=[],
                         help='Specify a config.out filename (associated with '
                              'pcode and dcode releases). When called with '
                              '--update_patch, will update and add PCODE or '
                              'DCODE fuses with values from this file. '
                              'NOTE: Filename should contain either "pcode"'
-                             'or "dcode" to determine which fuse prefix to use.')
-    parser.add_argument('--fuse_default_ovrd', metavar='fuse_default_ovrd', type=str,
-                        default='', required=False, help='Similar to config_out '
+                             'or "dcode" to determine which fuse prefix to use. '
+                             'Can be repeated, and mixed with --fuse_default_ovrd.')
+    parser.add_argument('--fuse_default_ovrd', metavar='fuse_default_ovrd',
+                        type=lambda path: (OVERRIDE_DEFAULT_OVRD, path),
+                        dest='override_files', action='append', default=[],
+                        help='Similar to config_out '
                         'option, but uses the fusegen default override format. '
-                        'Mutually exclusive with the config_out option.')
+                        'Can be repeated, and mixed with --config_out. Files '
+                        'are applied in command line order.')
+    parser.add_argument('--conflict_policy', type=str,
+                        choices=[POLICY_LAST_WINS, POLICY_ERROR],
+                        default=POLICY_LAST_WINS, help='What to do when two '
+                        'override files set different values for the same '
+                        'fuse. "last" (default) uses the value from the file '
+                        'given last; "error" reports every conflict and '
+                        'fails.')
     parser.add_argument('--dump_blob', metavar='dump_blob', type=str,
                         default='', required=False,
                         help='Specify a file representing a pcode or dcode blob '
@@ -198,7 +236,33 @@ def parse_args():
                         'will be used (unless --locked_fuses is specified). '
                         'Required: --old_patch, --new_patch, and --target. '
                         'Optional: --locked_fuses')
-    args = parser.parse_args()
+    parser.add_argument('--sources', metavar='sources', type=str, default='',
+                        help='Directory or glob pattern of fusegen XML files. '
+                        'Runs --high_groups, --print_fuse_stats, --pcode-stats '
+                        'or --dcode-stats over every file in parallel and '
+                        'writes one consolidated CSV (or JSON) to --target '
+                        'with a SOURCE column.')
+    parser.add_argument('--jobs', metavar='jobs', type=int,
+                        default=os.cpu_count(), help='Number of worker '
+                        'processes for --sources. Defaults to the CPU count.')
+    parser.add_argument('--strict', action='store_true', help='Stop with an '
+                        'error (file and line number) on malformed lines in '
+                        'patch, config.out and override files. By '
+                        'default malformed lines are skipped with a warning.')
+    parser.add_argument('--serve', metavar='fusegen_xml', type=str, nargs='*',
+                        default=None, help='Run as a daemon that keeps the '
+                        'given fusegen XML files (or --source) loaded and '
+                        'answers JSON requests over --socket. Models are '
+                        'reloaded when their files change.')
+    parser.add_argument('--socket', metavar='socket', type=str,
+                        default=get_default_socket(), help='UNIX socket path '
+                        'used by --serve, and by the client when forwarding '
+                        'requests to a running daemon. Defaults to '
+                        '$XDG_RUNTIME_DIR/fusegen-tools.sock, or a private '
+                        'per-user directory under the temp directory.')
+    parser.add_argument('--no_daemon', action='store_true', help='Always run '
+                        'locally, even if a --serve daemon is listening.')
+    args = parser.parse_args(argv)
     return args
 
 
@@ -615,6 +679,120 @@ def write_compute_file(target_file, name_file, lockbits, constants):
     return success
 
 
+# Builds a per-category lookup table of fuses that have real lockout IDs, so
+# each name in a SKU name file costs one dict lookup per category instead of a
+# scan over every fuse. The first fuse with a given name wins, which matches
+# the search order used by write_compute_file.
+def build_lockbit_index(lockbits):
+    index = {}
+    for cur_fuse in lockbits:
+        if (cur_fuse["LOCKID"] == -1):
+            # skip "fuses" that don't have a lockout id
+            continue
+        cat_index = index.setdefault(cur_fuse["CATEGORY"], {})
+        cat_index.setdefault(cur_fuse["NAME"], cur_fuse)
+    return index
+
+
+def load_name_list(name_file):
+    names = []
+    try:
+        inf = open(name_file, "r")
+    except:
+        print(f"ERROR: Unable to open input file {name_file}")
+        return None
+    with inf:
+        for cur_line in inf:
+            cur_name = cur_line.strip()
+            if (len(cur_name) > 0):
+                names.append(cur_name)
+    return names
+
+
+# Computes the LVID value and combined fuse width for every category, for every
+# name file (one per SKU) found in sku_dir. Returns a list of row dicts.
+def compute_sku_lockbits(sku_dir, lockbits, constants):
+    rows = []
+    index = build_lockbit_index(lockbits)
+    all_names = set()
+    for cat_index in index.values():
+        all_names.update(cat_index.keys())
+
+    name_files = sorted(entry.path for entry in os.scandir(sku_dir) if entry.is_file())
+    for name_file in name_files:
+        names = load_name_list(name_file)
+        if (names is None):
+            continue
+
+        row = {
+            "SKU" : os.path.splitext(os.path.basename(name_file))[0],
+            "FILE" : name_file,
+        }
+        for cur_const in constants:
+            cat_index = index.get(cur_const["REG"], {})
+            cat_map = 0
+            combined_width = 0
+            for cur_name in names:
+                cur_fuse = cat_index.get(cur_name)
+                if (cur_fuse is None):
+                    continue
+                cat_map = (cat_map | (1 << cur_fuse["LOCKID"]))
+                combined_width += cur_fuse["WIDTH"]
+            # pad to the width of this category's LockoutID row, same as compute mode
+            num_zeroes = (int(cur_const["WIDTH"] / 4)) + 2
+            row[cur_const["CONST"]] = f"{cat_map:#0{num_zeroes}x}"
+            row[f"{cur_const['CONST']}_WIDTH"] = combined_width
+
+        missing = [cur_name for cur_name in names if cur_name not in all_names]
+        for cur_name in missing:
+            print(f"WARNING: {row['SKU']}: Could not find valid fuse named {cur_name} for any fuse category.")
+        row["MISSING"] = len(missing)
+        rows.append(row)
+
+    print(f"INFO: Computed lockout values for {len(rows)} SKU name files in {sku_dir}")
+    return rows
+
+
+# Writes a list of row dicts as JSON (if target ends in .json) or as a CSV with
+# the given column order. Strings are quoted; numbers are not.
+def write_rows_file(target_file, columns, rows):
+    try:
+        outf = open(target_file, "w")
+    except:
+        print(f"ERROR: Unable to create target file {target_file}")
+        return False
+
+    with outf:
+        if target_file.lower().endswith(".json"):
+            json.dump(rows, outf, indent = 4)
+        else:
+            outf.write(",".join(f'"{col}"' for col in columns) + "\n")
+            for row in rows:
+                values = []
+                for col in columns:
+                    cur_value = row.get(col, "")
+                    if isinstance(cur_value, int):
+                        values.append(str(cur_value))
+                    else:
+                        values.append(f'"{cur_value}"')
+                outf.write(",".join(values) + "\n")
+    return True
+
+
+# Writes the SKU x category matrix as JSON (if target ends in .json) or CSV.
+def write_sku_lockbits_file(target_file, rows, constants):
+    columns = ["SKU"]
+    for cur_const in constants:
+        columns.append(cur_const["CONST"])
+        columns.append(f"{cur_const['CONST']}_WIDTH")
+    columns += ["MISSING", "FILE"]
+
+    if (False == write_rows_file(target_file, columns, rows)):
+        return False
+    print(f"Saved SKU lockout values to {target_file}.")
+    return True
+
+
 # Wrapper that iterates through XML file and gets items with new-style groups.
 def parse_for_high_groups(tree):
     root = tree.getroot()
@@ -833,32 +1011,51 @@ def get_pcode_stats(tree):
 def get_dcode_stats(tree):
     return get_fuse_stats(tree, "dmu_fuse/fw_fuses_")
 
-def load_fuse_names(filepath):
-    items = []
+# Raised for malformed input lines when parsing in strict mode.
+class PatchParseError(MyException):
+    pass
+
+
+# Malformed lines either abort parsing (strict) or are skipped with a warning
+# (lenient). Either way the file and line number are reported.
+def report_parse_error(filepath, line_num, message, strict):
+    text = f"{filepath}:{line_num}: {message}"
+    if (strict):
+        raise PatchParseError(f"ERROR: {text}")
+    print(f"WARNING: Skipping {text}")
+
+
+# Builds a name -> item dict from a list or stream of items. The first item with
+# a given name wins, matching find_by_name.
+def index_by_name(items):
+    index = {}
+    for cur_item in items:
+        index.setdefault(cur_item['NAME'], cur_item)
+    return index
+
+
+def iter_fuse_names(filepath):
     try:
         inf = open(filepath, "r")
     except:
         print(f"ERROR: Unable to open input file {filepath}")
-        return items
-
-    lines = inf.readlines()
-    inf.close()
-
-    for cur_line in lines:
-        stripped = cur_line.strip()
-        line_parts = stripped.split(" ", 7)
-        if line_parts[0][0] == "#":
-            # skip commented lines
-            continue
+        return
 
-        descrip_part = line_parts[0]
-        items.append(descrip_part)
+    with inf:
+        for cur_line in inf:
+            stripped = cur_line.strip()
+            if (len(stripped) == 0) or (stripped[0] == "#"):
+                # skip blank and commented lines
+                continue
+            line_parts = stripped.split(" ", 1)
+            yield line_parts[0]
 
+def load_fuse_names(filepath):
+    items = list(iter_fuse_names(filepath))
     print(f"INFO: Found {len(items)} items in file {filepath}")
     return items
 
-def load_patch_items(filepath, prefix = ""):
-    items = []
+def iter_patch_items(filepath, prefix = "", strict=False):
     prefix_filter = False
     if (len(prefix) > 0):
         prefix_filter = True
@@ -866,49 +1063,51 @@ def load_patch_items(filepath, prefix = ""):
         inf = open(filepath, "r")
     except:
         print(f"ERROR: Unable to open input file {filepath}")
-        return items
-
-    lines = inf.readlines()
-    inf.close()
+        return
 
-    for cur_line in lines:
-        stripped = cur_line.strip()
-        line_parts = stripped.split(" ", 7)
-        if line_parts[0][0] == "#":
-            # skip commented lines
-            continue
+    with inf:
+        for line_num, cur_line in enumerate(inf, 1):
+            stripped = cur_line.strip()
+            if (len(stripped) == 0) or (stripped[0] == "#"):
+                # skip blank and commented lines
+                continue
 
-        addr = int(line_parts[0], 16)
-        startbit = int(line_parts[1], 10)
-        numbits = int(line_parts[2], 10)
-        fuses_val = int(line_parts[3], 16)
-        # line_parts[4] is just a '#'
-        descrip_part = line_parts[5]
-        # print(f"descrip_part: >{descrip_part}<")
-
-        if (prefix_filter):
-            if (not name.descrip_part(prefix)):
-                # skip this fuse; doesn't match filter
+            line_parts = stripped.split(" ", 7)
+            try:
+                addr = int(line_parts[0], 16)
+                startbit = int(line_parts[1], 10)
+                numbits = int(line_parts[2], 10)
+                fuses_val = int(line_parts[3], 16)
+                # line_parts[4] is just a '#'
+                descrip_part = line_parts[5]
+            except (ValueError, IndexError):
+                report_parse_error(filepath, line_num, f"malformed patch line \"{stripped}\"", strict)
                 continue
+            # print(f"descrip_part: >{descrip_part}<")
 
-        item_type = "(fuse)"
-        try:
-            item_type = line_parts[6]
-        except:
-            item_type = "(fuse)"
+            if (prefix_filter):
+                if (not descrip_part.startswith(prefix)):
+                    # skip this fuse; doesn't match filter
+                    continue
 
-        new_item = {
-            "ADDR" : addr,
-            "STARTBIT" : startbit,
-            "WIDTH" : numbits,
-            "VALUE" : fuses_val,
-            "NAME" : descrip_part,
-            "TYPE" : item_type,
-            "CFGITEM" : False,
-            "SKIP" : False
-        }
-        items.append(new_item)
+            item_type = "(fuse)"
+            if (len(line_parts) > 6):
+                item_type = line_parts[6]
+
+            new_item = {
+                "ADDR" : addr,
+                "STARTBIT" : startbit,
+                "WIDTH" : numbits,
+                "VALUE" : fuses_val,
+                "NAME" : descrip_part,
+                "TYPE" : item_type,
+                "CFGITEM" : False,
+                "SKIP" : False
+            }
+            yield new_item
 
+def load_patch_items(filepath, prefix = "", strict=False):
+    items = list(iter_patch_items(filepath, prefix, strict))
     print(f"INFO: Found {len(items)} items in file {filepath}")
     return items
 
@@ -921,14 +1120,15 @@ def update_patch(old_items, new_items, target_path):
 
     outf = None
     try:
-        outf = open(target_file, "w")
+        outf = open(target_path, "w")
     except:
-        print(f"ERROR: Unable to create target file {target_file}")
+        print(f"ERROR: Unable to create target file {target_path}")
         return False
 
     outf.write("# RamAddr (hex) StartBit (dec) Width (dec) Value (hex)\n")
+    new_index = index_by_name(new_items)
     for cur_old in old_items:
-        cur_new = find_by_name(cur_old["NAME"], new_items)
+        cur_new = new_index.get(cur_old["NAME"])
         if (cur_new is None):
             items_not_found += 1
             print(f"WARNING: Could not find item named {cur_old['NAME']} in default_values file.")
@@ -978,18 +1178,14 @@ def update_patch(old_items, new_items, target_path):
     print(f"Fuses skipped because their values are the same as default: {items_skipped}")
     return True
 
-def parse_cfg_out(source_filename):
-    items = []
-
+def iter_cfg_out(source_filename, strict=False):
     # read in file
     inf = None
     try:
         inf = open(source_filename, "r")
     except:
         print(f"ERROR: Unable to open input file {source_filename}")
-        return items
-    lines = inf.readlines()
-    inf.close()
+        return
 
     # choose a prefex depending on filename
     basename = os.path.basename(source_filename)
@@ -999,76 +1195,86 @@ def parse_cfg_out(source_filename):
 
     STATE_LOCATING_CFG_FUSE = 0
     STATE_IN_CFG_FUSE = 1
-    STATE_END_OF_CFG_FUSE = 2
 
     # locate cfg.fuse section
     cur_state = STATE_LOCATING_CFG_FUSE
-    for cur_line in lines:
-        if (cur_state == STATE_LOCATING_CFG_FUSE):
-            if (cur_line.find("== cfg.fuse ==") != -1):
-                cur_state = STATE_IN_CFG_FUSE
-            # always continue
-            continue
-        elif (cur_state == STATE_END_OF_CFG_FUSE):
-            break
+    with inf:
+        for line_num, cur_line in enumerate(inf, 1):
+            if (cur_state == STATE_LOCATING_CFG_FUSE):
+                if (cur_line.find("== cfg.fuse ==") != -1):
+                    cur_state = STATE_IN_CFG_FUSE
+                # always continue
+                continue
 
-        # if we're here, we're in STATE_IN_CFG_FUSE
-        if (cur_line.find("===============") != -1):
-            cur_state = STATE_END_OF_CFG_FUSE
-            continue
+            # if we're here, we're in STATE_IN_CFG_FUSE
+            if (cur_line.find("===============") != -1):
+                # end of the cfg.fuse section; nothing else to read
+                break
 
-        # if we're here, it's a parse-able line
-        stripped = cur_line.strip()
-        line_parts = stripped.split(":", 2)
-        # parse each line into ["NAME"] and ["VALUE"] items.
-        fuse_name = f"{prefix}{line_parts[0].upper()}"
-        new_item = {
-            "NAME" : fuse_name,
-            "VALUE" : int(line_parts[1].strip())
-        }
-        items.append(new_item)
+            # if we're here, it's a parse-able line
+            stripped = cur_line.strip()
+            if (len(stripped) == 0):
+                continue
+            line_parts = stripped.split(":", 2)
+            # parse each line into ["NAME"] and ["VALUE"] items.
+            try:
+                fuse_value = int(line_parts[1].strip())
+            except (ValueError, IndexError):
+                report_parse_error(source_filename, line_num, f"malformed cfg.fuse line \"{stripped}\"", strict)
+                continue
+            fuse_name = f"{prefix}{line_parts[0].upper()}"
+            new_item = {
+                "NAME" : fuse_name,
+                "VALUE" : fuse_value
+            }
+            yield new_item
 
     # note: cfg_out values are all lower-case
     # note: need to identify prefixes to use (maybe use different prefix based on filename?)
-    return items
 
-def parse_default_ovrd(source_filename):
-    items = []
+def parse_cfg_out(source_filename, strict=False):
+    return list(iter_cfg_out(source_filename, strict))
 
+def iter_default_ovrd(source_filename, strict=False):
     # read in file
     inf = None
     try:
         inf = open(source_filename, "r")
     except:
         print(f"ERROR: Unable to open input file {source_filename}")
-        return items
-    lines = inf.readlines()
-    inf.close()
+        return
 
-    for cur_line in lines:
-        stripped = cur_line.strip()
-        if len(stripped) == 0:
-            continue
+    with inf:
+        for line_num, cur_line in enumerate(inf, 1):
+            stripped = cur_line.strip()
+            if len(stripped) == 0:
+                continue
 
-        if (stripped[0] == '#'):
-            # discard commented lines
-            continue
+            if (stripped[0] == '#'):
+                # discard commented lines
+                continue
 
-        # replace / with _
-        #stripped = stripped.replace('/', '_')
-
-        line_parts = stripped.split("=", 2)
-        # parse each line into ["NAME"] and ["VALUE"] items.
-        # fuse_name = f"{line_parts[0]}"
-        fuse_name = fixupFuseName(line_parts[0].strip())
-        new_item = {
-            "NAME" : fuse_name,
-            # "VALUE" : int(line_parts[1].strip(), 16)
-            "VALUE" : process_value(line_parts[1].strip())
-        }
-        items.append(new_item)
+            # replace / with _
+            #stripped = stripped.replace('/', '_')
 
-    return items
+            line_parts = stripped.split("=", 2)
+            # parse each line into ["NAME"] and ["VALUE"] items.
+            # fuse_name = f"{line_parts[0]}"
+            try:
+                # fuse_value = int(line_parts[1].strip(), 16)
+                fuse_value = process_value(line_parts[1].strip())
+            except (MyException, IndexError):
+                report_parse_error(source_filename, line_num, f"malformed override line \"{stripped}\"", strict)
+                continue
+            fuse_name = fixupFuseName(line_parts[0].strip())
+            new_item = {
+                "NAME" : fuse_name,
+                "VALUE" : fuse_value
+            }
+            yield new_item
+
+def parse_default_ovrd(source_filename, strict=False):
+    return list(iter_default_ovrd(source_filename, strict))
 
 
 def dump_blob(blob_file, default_values, target_file, start_address):
@@ -1095,7 +1301,7 @@ def dump_blob(blob_file, default_values, target_file, start_address):
         inf = open(blob_file, "r")
     except:
         print("ERROR: Unable to open input file (",
-              name_file,
+              blob_file,
               ").")
         outf.close()  # close opened file
         return success
@@ -1415,8 +1621,7 @@ def save_patch_items(target_file, fuse_items):
     print(f"Saved output to {target_file}.")
     return True
 
-def load_xml_items(filepath, prefix = ""):
-    items = []
+def iter_xml_items(filepath, prefix = ""):
     prefix_filter = False
     if (len(prefix) > 0):
         prefix_filter = True
@@ -1425,9 +1630,9 @@ def load_xml_items(filepath, prefix = ""):
     try:
         input_tree = etree.parse(open(filepath, "rb"))
     except FileNotFoundError:
-        print("ERROR: Fusegen file not found (", source_xml,
+        print("ERROR: Fusegen file not found (", filepath,
             ") Please specify a valid fusegen XML file as input.")
-        return items
+        return
 
     root = input_tree.getroot()
     assert root.tag == "FuseGen"
@@ -1457,32 +1662,34 @@ def load_xml_items(filepath, prefix = ""):
                     "VALUE" : process_value(fuse.find("FuseDefaultValue").text),
                     "TYPE" : fuse.find("Group").text
                 }
-                items.append(fuse_entry)
+                yield fuse_entry
 
-    return items
+def load_xml_items(filepath, prefix = ""):
+    return list(iter_xml_items(filepath, prefix))
 
 # TODO: Option to pass patch file for updated values?
-def compare_patch(old_patch_file, new_patch_file, load_fusegen, prefix = ""):
+def compare_patch(old_patch_file, new_patch_file, load_fusegen, prefix = "", strict=False):
     if (len(old_patch_file) == 0):
         print("ERROR: Please use --old_patch argument to pass path of an old patch file.")
         return False
     if (len(new_patch_file) == 0):
         print("ERROR: Please use --new_patch argument to pass path of a new patch file.")
         return False
-    old_items = []
+    # only the new items are held in memory (plus a name index); old items are
+    # streamed past them
     new_items = []
     if not load_fusegen:
-        old_items = load_patch_items(args.old_patch, prefix)
-        new_items = load_patch_items(args.new_patch, prefix)
+        old_stream = iter_patch_items(old_patch_file, prefix, strict)
+        new_items = load_patch_items(new_patch_file, prefix, strict)
     else:
-        old_items = load_xml_items(args.old_patch, prefix)
-        new_items = load_xml_items(args.new_patch, prefix)
-    if (len(old_items) == 0):
-        print(f"ERROR: No items loaded from {args.old_patch}")
-        return False
+        old_stream = iter_xml_items(old_patch_file, prefix)
+        new_items = load_xml_items(new_patch_file, prefix)
     if (len(new_items) == 0):
-        print(f"ERROR: No items loaded from {args.new_patch}")
+        print(f"ERROR: No items loaded from {new_patch_file}")
         return False
+    new_index = index_by_name(new_items)
+    old_names = set()
+    num_old_items = 0
 
     only_old = []  # items only in old patch
     only_new = []  # items only in new patch
@@ -1491,9 +1698,11 @@ def compare_patch(old_patch_file, new_patch_file, load_fusegen, prefix = ""):
     diff_templates = [] # in both, different receiver address, size, startbit, etc.
 
     # search for old items in new patch
-    for cur_old in old_items:
+    for cur_old in old_stream:
+        num_old_items += 1
+        old_names.add(cur_old['NAME'])
         # mutually exclusive comparisons
-        found_new = find_by_name(cur_old['NAME'], new_items)
+        found_new = new_index.get(cur_old['NAME'])
         if (found_new is None):
             only_old.append(cur_old)
         elif (cur_old['VALUE'] == found_new['VALUE']):
@@ -1524,10 +1733,15 @@ def compare_patch(old_patch_file, new_patch_file, load_fusegen, prefix = ""):
                 }
                 diff_templates.append(diff_item)
 
+    if (num_old_items == 0):
+        print(f"ERROR: No items loaded from {old_patch_file}")
+        return False
+    if not load_fusegen:
+        print(f"INFO: Found {num_old_items} items in file {old_patch_file}")
+
     # search for items only in new patch
     for cur_new in new_items:
-        found_old = find_by_name(cur_new['NAME'], old_items)
-        if (found_old is None):
+        if (cur_new['NAME'] not in old_names):
             only_new.append(cur_new)
 
     print(f"Items only in old patch ({len(only_old)}):")
@@ -1812,12 +2026,53 @@ def print_stats(stats_entries):
 
     return True
 
-def merge_values(default_values, config_out_items, target, changes_only):
+# Loads each --config_out/--fuse_default_ovrd file, in command line order.
+# Returns a list of (path, items) tuples.
+def load_override_sets(override_files, strict=False):
+    override_sets = []
+    for kind, path in override_files:
+        print(f"args.{kind}: {path}")
+        if (kind == OVERRIDE_CFG_OUT):
+            items = parse_cfg_out(path, strict)
+        else:
+            items = parse_default_ovrd(path, strict)
+        override_sets.append((path, items))
+    return override_sets
+
+
+# Folds all override sets into a single name -> item dict. Later files win
+# (POLICY_LAST_WINS) or conflicting values are reported and None is returned
+# (POLICY_ERROR). Each resulting item records the file its value came from.
+def resolve_overrides(override_sets, policy = POLICY_LAST_WINS):
+    resolved = {}
+    conflicts = 0
+    for path, items in override_sets:
+        for cur_item in items:
+            prev_item = resolved.get(cur_item['NAME'])
+            if (prev_item is not None) and (prev_item['VALUE'] != cur_item['VALUE']):
+                if (policy == POLICY_ERROR):
+                    print(f"ERROR: {cur_item['NAME']} is 0x{prev_item['VALUE']:x} in {prev_item['SOURCE']} but 0x{cur_item['VALUE']:x} in {path}")
+                    conflicts += 1
+                    continue
+                print(f"NOTE: {cur_item['NAME']} = 0x{cur_item['VALUE']:x} from {path} replaces 0x{prev_item['VALUE']:x} from {prev_item['SOURCE']}")
+            resolved[cur_item['NAME']] = {
+                "NAME" : cur_item['NAME'],
+                "VALUE" : cur_item['VALUE'],
+                "SOURCE" : path
+            }
+
+    if (conflicts > 0):
+        print(f"ERROR: Found {conflicts} conflicting override values.")
+        return None
+    return resolved
+
+
+def merge_values(default_values, config_out_items, target, changes_only, strict=False):
     if (len(default_values) == 0):
         print("ERROR: No --default_values file specified!")
         return False
     if (len(config_out_items) == 0):
-        print("ERROR: No items found in --fuse_default_ovrd file!")
+        print("ERROR: No items found in --fuse_default_ovrd/--config_out files!")
         return False
     if (len(target) == 0):
         print("ERROR: No --target file specified!")
@@ -1827,13 +2082,15 @@ def merge_values(default_values, config_out_items, target, changes_only):
     items_updated = [] # dicts of items that had new values
     items_skipped = 0
 
-    default_items = load_patch_items(default_values)
+    default_items = load_patch_items(default_values, strict=strict)
     if (len(default_items) == 0):
         print(f"ERROR: {default_values} contained no entries!")
         return False
 
+    # index defaults once; each override is then a single lookup
+    default_index = index_by_name(default_items)
     for config_item in config_out_items:
-        matching = next((default_item for default_item in default_items if default_item['NAME'] == config_item['NAME']), None)
+        matching = default_index.get(config_item['NAME'])
         if matching is None:
             items_not_found.append(config_item['NAME'])
         else:
@@ -1862,31 +2119,25 @@ def merge_values(default_values, config_out_items, target, changes_only):
     print(f"\nItems with unchanged values: {items_skipped}")
     return True
 
-def merge_patches(old_patch, new_patch, locked_fuses, target):
+def merge_patches(old_patch, new_patch, locked_fuses, target, strict=False):
     unchanged_values = 0
     changed_values = 0
     new_fuses = 0
     skipped_locked = 0
 
     # load old patch
-    old_items = load_patch_items(old_patch)
+    old_items = load_patch_items(old_patch, strict=strict)
     if (len(old_items) == 0):
         print(f"ERROR: No items found in old patch {old_patch}")
         return False
 
-    # load new patch
-    new_items = load_patch_items(new_patch)
-    if (len(new_items) == 0):
-        print(f"ERROR: No items found in new patch {new_patch}")
-        return False
-
     # load locked fuses
     keep_locked = False
-    locked_items = []
+    locked_items = set()
     if (len(locked_fuses) == 0):
         print("INFO: No locked_fuses file specified. Using all new values when found...")
     else:
-        locked_items = load_fuse_names(locked_fuses)
+        locked_items = set(load_fuse_names(locked_fuses))
         if (len(locked_items) == 0):
             print(f"WARNING: No items found in locked_fuses file {locked_fuses}. Ignoring...")
         else:
@@ -1895,9 +2146,12 @@ def merge_patches(old_patch, new_patch, locked_fuses, target):
     # for each old_item:
     # - copy all items to new list
     merged_list = old_items
+    merged_index = index_by_name(merged_list)
 
-    # for each new_item:
-    for cur_item in new_items:
+    # for each new_item (streamed from the new patch):
+    num_new_items = 0
+    for cur_item in iter_patch_items(new_patch, strict=strict):
+        num_new_items += 1
         # - check if in locked_items. skip if it is.
         if (keep_locked and cur_item['NAME'] in locked_items):
             print(f"INFO: {cur_item['NAME']} is a locked item.")
@@ -1906,10 +2160,11 @@ def merge_patches(old_patch, new_patch, locked_fuses, target):
 
         # - check if already in new list.
         # -- if found in new list, update item (if we're here we've already passed locked_items check)
-        found_item = find_by_name(cur_item['NAME'], merged_list)
+        found_item = merged_index.get(cur_item['NAME'])
         if found_item is None:
             # no match found; just add this item
             merged_list.append(cur_item)
+            merged_index[cur_item['NAME']] = cur_item
             new_fuses += 1
         else:
             if found_item['VALUE'] != cur_item['VALUE']:
@@ -1920,6 +2175,11 @@ def merge_patches(old_patch, new_patch, locked_fuses, target):
             else:
                 unchanged_values += 1
 
+    if (num_new_items == 0):
+        print(f"ERROR: No items found in new patch {new_patch}")
+        return False
+    print(f"INFO: Found {num_new_items} items in file {new_patch}")
+
     if (False == save_patch_items(target, merged_list)):
         print(f"ERROR: Failed to save file {target}")
         return False
@@ -1932,9 +2192,503 @@ def merge_patches(old_patch, new_patch, locked_fuses, target):
 
     return True
 
-if __name__ == "__main__":
-    args = parse_args()
+# Column layouts for the consolidated --sources output, per scan mode.
+SCAN_HIGH_GROUPS = "high_groups"
+SCAN_FUSE_STATS = "fuse_stats"
+SCAN_PCODE_STATS = "pcode_stats"
+SCAN_DCODE_STATS = "dcode_stats"
+SCAN_COLUMNS = {
+    SCAN_HIGH_GROUPS : ["SOURCE", "CATEGORY", "PORTID", "NAME", "ADDR", "TYPE", "GROUPNUM"],
+    SCAN_FUSE_STATS : ["SOURCE", "INSTANCE", "PORTID", "SBEP", "KIND", "GROUP", "SIZE", "ROWS", "BASE_RAM_ADDR", "BASE_RCVR_ADDR"],
+    SCAN_PCODE_STATS : ["SOURCE", "POSITION", "NAME", "RAMADDR", "STARTBIT", "WIDTH", "RCVRADDR"],
+    SCAN_DCODE_STATS : ["SOURCE", "POSITION", "NAME", "RAMADDR", "STARTBIT", "WIDTH", "RCVRADDR"],
+}
+
+
+# Expands a --sources argument (a directory or a glob pattern) into a sorted
+# list of fusegen XML files.
+def find_fusegen_sources(source_spec):
+    if os.path.isdir(source_spec):
+        found = []
+        for dirpath, dirnames, filenames in os.walk(source_spec):
+            for cur_name in filenames:
+                if cur_name.lower().endswith(".xml"):
+                    found.append(os.path.join(dirpath, cur_name))
+        return sorted(found)
+    return sorted(glob.glob(source_spec, recursive=True))
+
+
+def get_scan_mode(args):
+    if (args.high_groups):
+        return SCAN_HIGH_GROUPS
+    if (args.print_fuse_stats):
+        return SCAN_FUSE_STATS
+    if (args.pcode_stats):
+        return SCAN_PCODE_STATS
+    if (args.dcode_stats):
+        return SCAN_DCODE_STATS
+    return None
+
+
+# Parses one fusegen file and returns (source, rows, error). Runs in a worker
+# process, so it never raises; any failure is returned as an error string and
+# only affects this file.
+def scan_fusegen_source(source, scan_mode):
+    rows = []
+    try:
+        # the parse helpers print per-item progress; keep workers quiet
+        with contextlib.redirect_stdout(io.StringIO()):
+            tree = etree.parse(open(source, "rb"))
+            if (scan_mode == SCAN_HIGH_GROUPS):
+                for cur_el in parse_for_high_groups(tree):
+                    rows.append({
+                        "SOURCE" : source,
+                        "CATEGORY" : cur_el["CATEGORY"],
+                        "PORTID" : f"{cur_el['PORTID']:#02x}",
+                        "NAME" : cur_el["NAME"],
+                        "ADDR" : f"{cur_el['ADDR']:#06x}",
+                        "TYPE" : cur_el["TYPE"],
+                        "GROUPNUM" : cur_el["GROUPNUM"]
+                    })
+            elif (scan_mode == SCAN_FUSE_STATS):
+                ip_info = get_ip_info(tree)
+                stats_entries = get_stats(get_dlut(tree, ip_info))
+                for cur_entry in stats_entries.values():
+                    for kind, groups in (("Fuse", cur_entry.fuse_groups), ("Strap", cur_entry.strap_groups)):
+                        for group, cg in groups.items():
+                            rows.append({
+                                "SOURCE" : source,
+                                "INSTANCE" : cur_entry.instance,
+                                "PORTID" : f"0x{cur_entry.portid_full:04x}",
+                                "SBEP" : cur_entry.sbep,
+                                "KIND" : kind,
+                                "GROUP" : group,
+                                "SIZE" : cg.size_total,
+                                "ROWS" : cg.rows,
+                                "BASE_RAM_ADDR" : f"0x{cg.base_ram_addr:04x}",
+                                "BASE_RCVR_ADDR" : f"0x{cg.base_rcvr_addr:04x}"
+                            })
+            else:
+                if (scan_mode == SCAN_PCODE_STATS):
+                    low_fuse, high_fuse = get_pcode_stats(tree)
+                else:
+                    low_fuse, high_fuse = get_dcode_stats(tree)
+                for position, cur_fuse in (("LOW", low_fuse), ("HIGH", high_fuse)):
+                    if (cur_fuse is None):
+                        continue
+                    row = {"SOURCE" : source, "POSITION" : position}
+                    row.update(cur_fuse)
+                    rows.append(row)
+    except Exception as e:
+        return source, [], repr(e)
+    return source, rows, None
+
+
+# Runs a high_groups/stats scan over every fusegen file matched by --sources
+# in a process pool, and writes one consolidated CSV (or JSON) with a SOURCE
+# column. Files that fail to parse are reported and skipped.
+def scan_sources(source_spec, scan_mode, target_file, jobs):
+    sources = find_fusegen_sources(source_spec)
+    if (len(sources) == 0):
+        print(f"ERROR: No fusegen files found matching {source_spec}")
+        return False
+
+    print(f"Scanning {len(sources)} fusegen files ({scan_mode}) with {jobs} jobs...")
+    results = {}
+    failures = {}
+    done = 0
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {executor.submit(scan_fusegen_source, cur_source, scan_mode) : cur_source for cur_source in sources}
+        for cur_future in concurrent.futures.as_completed(futures):
+            cur_source = futures[cur_future]
+            done += 1
+            try:
+                source, rows, error = cur_future.result()
+            except Exception as e:
+                # worker process died (out of memory, etc.)
+                rows, error = [], repr(e)
+            if (error is not None):
+                failures[cur_source] = error
+                print(f"[{done}/{len(sources)}] ERROR: {cur_source}: {error}")
+            else:
+                results[cur_source] = rows
+                print(f"[{done}/{len(sources)}] {cur_source}: {len(rows)} rows")
+
+    # keep output order stable regardless of completion order
+    all_rows = []
+    for cur_source in sources:
+        all_rows += results.get(cur_source, [])
 
+    if (False == write_rows_file(target_file, SCAN_COLUMNS[scan_mode], all_rows)):
+        return False
+    print(f"Saved {len(all_rows)} rows from {len(results)} files to {target_file}.")
+    if (len(failures) > 0):
+        print(f"WARNING: {len(failures)} files failed:")
+        for cur_source, error in failures.items():
+            print(f" - {cur_source}: {error}")
+    return len(results) > 0
+
+
+# Holds a parsed fusegen XML file plus the derived lists that most modes need, so
+# the --serve daemon can answer many requests without re-parsing the XML. The
+# file's mtime is recorded at load time; is_stale() tells the daemon when the
+# source changed on disk and the model needs to be reloaded.
+class FusegenModel:
+    def __init__(self, source_xml):
+        self.source_xml = source_xml
+        self.mtime = 0.0
+        self.tree = None
+        self.ip_info = []
+        self.dlut_list = []
+        self.items = []
+        self.by_name = {}
+        self.by_addr = {}
+        self.by_portid = {}
+
+    def load(self):
+        # get xml tree from passed file
+        try:
+            self.mtime = os.path.getmtime(self.source_xml)
+            self.tree = etree.parse(open(self.source_xml, "rb"))
+        except FileNotFoundError:
+            print("ERROR: Fusegen file not found (", self.source_xml,
+                ") Please specify a valid fusegen XML file as input.")
+            return False
+
+        # get list of fusegen IPs
+        self.ip_info = get_ip_info(self.tree)
+        if (len(self.ip_info) == 0):
+            print(f"ERROR: No SOC Instances read from {self.source_xml}")
+            return False
+
+        # get dlut
+        self.dlut_list = get_dlut(self.tree, self.ip_info)
+        if (len(self.dlut_list) == 0):
+            print(f"ERROR: No DLUT read from {self.source_xml}")
+            return False
+
+        self.build_indexes()
+        return True
+
+    def is_stale(self):
+        try:
+            return os.path.getmtime(self.source_xml) != self.mtime
+        except OSError:
+            # file removed or unreadable; keep serving the last good copy
+            return False
+
+    def build_indexes(self):
+        self.items = []
+        self.by_name = {}
+        self.by_addr = {}
+        self.by_portid = {}
+
+        root = self.tree.getroot()
+        for el in root:
+            if ((el.tag != "DirectFuses") and (el.tag != "SoftStraps")):
+                continue
+            for fuse in el:
+                name = fuse.find("name").text.strip()
+                portid = None
+                portid_text = get_element_text(fuse, "IOSFSBPortID")
+                if len(portid_text) > 0:
+                    portid = process_value(portid_text)
+                fuse_entry = {
+                    "NAME" : fixupFuseName(name),
+                    "XMLNAME" : name,
+                    "ADDR" : process_value(get_element_text(fuse, "RamAddr")),
+                    "STARTBIT" : process_value(get_element_text(fuse, "StartBit")),
+                    "WIDTH" : process_value(get_element_text(fuse, "FUSE_WIDTH")),
+                    "VALUE" : process_value(get_element_text(fuse, "FuseDefaultValue")),
+                    "CATEGORY" : get_element_text(fuse, "Category"),
+                    "TYPE" : get_element_text(fuse, "Group"),
+                    "GROUPNUM" : process_value(get_element_text(fuse, "GroupNumber")),
+                    "PORTID" : portid
+                }
+                self.items.append(fuse_entry)
+                # fixed-up and original XML names both resolve to the same entry
+                self.by_name[fuse_entry["NAME"]] = fuse_entry
+                self.by_name[name] = fuse_entry
+                self.by_addr.setdefault(fuse_entry["ADDR"], []).append(fuse_entry)
+                if (portid is not None):
+                    self.by_portid.setdefault(portid, []).append(fuse_entry)
+
+
+def get_element_text(fuse, tag):
+    # missing or empty elements are treated as empty strings
+    child = fuse.find(tag)
+    if (child is None) or (child.text is None):
+        return ""
+    return child.text.strip()
+
+
+def lookup_items(model, name=None, addr=None, portid=None):
+    if (name is not None):
+        found = model.by_name.get(name)
+        if (found is None):
+            return []
+        return [found]
+    if (addr is not None):
+        return model.by_addr.get(process_value(str(addr)), [])
+    if (portid is not None):
+        return model.by_portid.get(process_value(str(portid)), [])
+    return []
+
+
+# The socket lives in $XDG_RUNTIME_DIR when there is one, otherwise in a
+# private (0700) per-user directory under the temp directory, never directly
+# in a directory other users can write to.
+def get_default_socket():
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR", "")
+    if (len(runtime_dir) > 0) and os.path.isdir(runtime_dir):
+        return os.path.join(runtime_dir, "fusegen-tools.sock")
+    return os.path.join(tempfile.gettempdir(), f"fusegen-tools-{os.getuid()}", "fusegen-tools.sock")
+
+
+# True if path exists and belongs to the current user. Anything else could
+# have been put there by someone else to answer our requests.
+def is_own_path(path):
+    try:
+        return os.lstat(path).st_uid == os.getuid()
+    except OSError:
+        return False
+
+
+# Creates the directory for the daemon socket (0700) if it doesn't exist yet.
+# Returns False if the directory exists but isn't the current user's.
+def make_socket_dir(socket_path):
+    socket_dir = os.path.dirname(os.path.abspath(socket_path))
+    if (not os.path.exists(socket_dir)):
+        try:
+            os.makedirs(socket_dir, mode=0o700)
+        except OSError as e:
+            print(f"ERROR: Unable to create {socket_dir}: {e}")
+            return False
+    # a shared directory like /tmp is fine when given explicitly; a
+    # directory someone else made in place of the private default is not
+    if (socket_dir != os.path.dirname(get_default_socket())):
+        return True
+    if (not is_own_path(socket_dir)) or (os.stat(socket_dir).st_mode & 0o077):
+        print(f"ERROR: {socket_dir} is not a private directory owned by you")
+        return False
+    return True
+
+
+# Translates a dict of argument names/values into a command line for run_tool.
+# True values become flags, False/None values are omitted.
+def build_argv(op_args):
+    argv = []
+    for key, value in op_args.items():
+        if (value is None) or (value is False):
+            continue
+        argv.append(f"--{key}")
+        if (value is not True):
+            argv.append(str(value))
+    return argv
+
+
+class FusegenDaemon:
+    # modes that can be requested by name instead of passing a full argv list
+    FLAG_OPS = ["make_patch", "compare_patch", "compare_xml", "update_patch",
+                "prune_patch", "merge_values", "merge_patches", "high_groups"]
+    BLOB_OPS = ["import_text_blob", "import_int_blob", "dump_blob"]
+    # seconds a client has to send its request line (and to read the reply)
+    # before its connection is dropped
+    CLIENT_TIMEOUT = 10.0
+
+    def __init__(self, socket_path, sources):
+        self.socket_path = socket_path
+        self.models = {}
+        self.running = False
+        for cur_source in sources:
+            self.get_model(cur_source)
+
+    def get_model(self, source_xml):
+        key = os.path.abspath(source_xml)
+        model = self.models.get(key)
+        if (model is not None) and (not model.is_stale()):
+            return model
+
+        if (model is None):
+            print(f"INFO: Loading {key}...", file=sys.stderr)
+        else:
+            print(f"INFO: {key} changed on disk. Reloading...", file=sys.stderr)
+        new_model = FusegenModel(key)
+        if (False == new_model.load()):
+            # keep serving the previous copy if the new file doesn't parse
+            return model
+        self.models[key] = new_model
+        return new_model
+
+    # Decodes and answers one request line. Never raises: a bad request only
+    # gets an error response, so it can't stop the daemon.
+    def handle_line(self, line):
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            return {"ok" : False, "error" : f"Bad request: {e}"}
+        if (not isinstance(request, dict)):
+            return {"ok" : False, "error" : "Bad request: expected a JSON object"}
+        try:
+            return self.handle_request(request)
+        except Exception as e:
+            return {"ok" : False, "error" : repr(e)}
+
+    def handle_request(self, request):
+        op = request.get("op", "run")
+        cwd = request.get("cwd", os.getcwd())
+
+        if (op == "status"):
+            loaded = [{"SOURCE" : key, "ITEMS" : len(model.items)} for key, model in self.models.items()]
+            return {"ok" : True, "models" : loaded}
+        if (op == "shutdown"):
+            self.running = False
+            return {"ok" : True}
+
+        source = os.path.join(cwd, request.get("source", "fusegen.xml"))
+        if (op == "reload"):
+            self.models.pop(os.path.abspath(source), None)
+            return {"ok" : self.get_model(source) is not None}
+        if (op == "lookup"):
+            model = self.get_model(source)
+            if (model is None):
+                return {"ok" : False, "error" : f"Unable to load {source}"}
+            items = lookup_items(model, request.get("name"), request.get("addr"), request.get("portid"))
+            return {"ok" : True, "items" : items}
+
+        # everything else is a regular tool invocation
+        if (op == "run"):
+            argv = request.get("argv")
+            if (argv is None):
+                argv = build_argv(request.get("args", {}))
+        elif (op in self.FLAG_OPS):
+            argv = [f"--{op}"] + build_argv(request.get("args", {}))
+        elif (op in self.BLOB_OPS):
+            argv = [f"--{op}", request.get("blob", "")] + build_argv(request.get("args", {}))
+        else:
+            return {"ok" : False, "error" : f"Unknown op {op}"}
+        return self.run_argv(argv, cwd)
+
+    def run_argv(self, argv, cwd):
+        output = io.StringIO()
+        success = False
+        prev_cwd = os.getcwd()
+        try:
+            # relative paths in argv are relative to the client, not the daemon
+            os.chdir(cwd)
+            with contextlib.redirect_stdout(output):
+                try:
+                    args = parse_args(argv)
+                except SystemExit:
+                    # argparse already wrote usage/errors
+                    return {"ok" : False, "output" : output.getvalue()}
+                model = None
+                if (not args.serve) and need_fusegen_model(args):
+                    model = self.get_model(args.source)
+                    if (model is None):
+                        print(f"ERROR: Unable to load {args.source}")
+                        return {"ok" : False, "output" : output.getvalue()}
+                success = run_tool(args, model)
+        except Exception as e:
+            return {"ok" : False, "output" : output.getvalue(), "error" : repr(e)}
+        finally:
+            os.chdir(prev_cwd)
+        return {"ok" : bool(success), "output" : output.getvalue()}
+
+    def serve(self):
+        if (not make_socket_dir(self.socket_path)):
+            return False
+        # remove a socket left behind by a daemon that didn't shut down cleanly
+        if os.path.lexists(self.socket_path):
+            if (not is_own_path(self.socket_path)):
+                print(f"ERROR: {self.socket_path} belongs to another user")
+                return False
+            if (daemon_request(self.socket_path, {"op" : "status"}) is not None):
+                print(f"ERROR: A daemon is already listening on {self.socket_path}")
+                return False
+            os.unlink(self.socket_path)
+
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # create the socket 0600 from the start rather than chmod'ing it after bind
+        prev_umask = os.umask(0o177)
+        try:
+            server.bind(self.socket_path)
+        finally:
+            os.umask(prev_umask)
+        server.listen(8)
+        print(f"INFO: Serving {len(self.models)} fusegen model(s) on {self.socket_path}")
+        self.running = True
+        try:
+            # requests are handled one at a time; run_tool redirects stdout
+            # and changes directories, so it can't be run concurrently
+            while self.running:
+                conn, _ = server.accept()
+                with conn:
+                    # a client that never sends a full line mustn't block everyone else
+                    conn.settimeout(self.CLIENT_TIMEOUT)
+                    reader = conn.makefile("rb")
+                    try:
+                        line = reader.readline()
+                    except socket.timeout:
+                        print("WARNING: Dropping client that sent no request", file=sys.stderr)
+                        continue
+                    except OSError:
+                        continue
+                    if not line:
+                        continue
+                    response = self.handle_line(line)
+                    try:
+                        conn.sendall(json.dumps(response).encode("utf-8") + b"\n")
+                    except OSError:
+                        # client went away
+                        pass
+        except KeyboardInterrupt:
+            print("INFO: Shutting down...")
+        finally:
+            server.close()
+            os.unlink(self.socket_path)
+        return True
+
+
+# Sends a single JSON request to the daemon and returns the decoded response,
+# or None if no daemon of ours is listening. A socket owned by another user is
+# ignored, so nobody else can answer for the tool.
+def daemon_request(socket_path, request):
+    if not os.path.exists(socket_path):
+        return None
+    if (not is_own_path(socket_path)):
+        print(f"WARNING: Ignoring {socket_path}, which belongs to another user", file=sys.stderr)
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(socket_path)
+            client.sendall(json.dumps(request).encode("utf-8") + b"\n")
+            reply = client.makefile("rb").readline()
+    except OSError:
+        return None
+    if not reply:
+        return None
+    try:
+        response = json.loads(reply)
+    except ValueError:
+        return None
+    if (not isinstance(response, dict)):
+        return None
+    return response
+
+
+def need_fusegen_model(args):
+    # mirrors the need_fusegen checks in run_tool
+    if (len(args.sources) > 0):
+        return False
+    if (args.reconcile_patch or args.update_patch or args.prune_patch or
+            args.compare_patch or args.compare_xml or args.merge_values or
+            args.merge_patches or (len(args.dump_blob) > 0)):
+        return False
+    return True
+
+
+def run_tool(args, model=None):
     source_xml = args.source
     target_file = args.target
     input_tree = None
@@ -1942,6 +2696,19 @@ if __name__ == "__main__":
     success = False
     need_fusegen = True
 
+    if (len(args.sources) > 0):
+        # multi-source scan; each worker parses its own fusegen file
+        scan_mode = get_scan_mode(args)
+        if (scan_mode is None):
+            print("ERROR: --sources requires --high_groups, --print_fuse_stats, --pcode-stats, or --dcode-stats.")
+            return success
+        success = scan_sources(args.sources, scan_mode, target_file, args.jobs)
+        if (success):
+            print("Operation succeeded!")
+        else:
+            print("Operation failed.")
+        return success
+
     # some features don't require fusegen:
     if (args.reconcile_patch):
         need_fusegen = False
@@ -1965,33 +2732,23 @@ if __name__ == "__main__":
     ip_info = []
     dlut_list = []
     if (need_fusegen):
-        # get xml tree from passed file
-        try:
-            input_tree = etree.parse(open(source_xml, "rb"))
-        except FileNotFoundError:
-            print("ERROR: Fusegen file not found (", source_xml,
-                ") Please specify a valid fusegen XML file as input.")
-            quit()
-
-        # get list of fusegen IPs
-        ip_info = get_ip_info(input_tree)
-        if (len(ip_info) == 0):
-            print(f"ERROR: No SOC Instances read from {args.target}")
-            quit()
-
-        # get dlut
-        dlut_list = get_dlut(input_tree, ip_info)
-        if (len(dlut_list) == 0):
-            print(f"ERROR: No DLUT read from {args.target}")
-            quit()
+        if (model is None):
+            # no cached model (regular command line use); parse the fusegen file now
+            model = FusegenModel(source_xml)
+            if (False == model.load()):
+                return success
+        input_tree = model.tree
+        ip_info = model.ip_info
+        dlut_list = model.dlut_list
 
     config_out_items = []
-    if len(args.config_out) > 0:
-        print(f"args.config_out: {args.config_out}")
-        config_out_items = parse_cfg_out(args.config_out)
-    elif len(args.fuse_default_ovrd) > 0:
-        print(f"args.fuse_default_ovrd: {args.fuse_default_ovrd}")
-        config_out_items = parse_default_ovrd(args.fuse_default_ovrd)
+    if len(args.override_files) > 0:
+        override_sets = load_override_sets(args.override_files, args.strict)
+        resolved = resolve_overrides(override_sets, args.conflict_policy)
+        if (resolved is None):
+            print("Operation failed.")
+            return success
+        config_out_items = list(resolved.values())
 
 
     if (args.high_groups):
@@ -2026,48 +2783,45 @@ if __name__ == "__main__":
         print(high_fuse)
     elif (args.compare_patch):
         # 3rd argument is for patch files vs fusegen XML
-        success = compare_patch(args.old_patch, args.new_patch, False)
-        quit()
+        success = compare_patch(args.old_patch, args.new_patch, False, strict=args.strict)
+        return success
     elif (args.compare_xml):
         # 3rd argument is for patch files vs fusegen XML
         success = compare_patch(args.old_patch, args.new_patch, True, args.prefix)
-        quit()
+        return success
     elif (args.merge_values):
-        success == merge_values(args.default_values, config_out_items, args.target, args.changes_only)
-        quit()
+        success = merge_values(args.default_values, config_out_items, args.target, args.changes_only, args.strict)
+        return success
     elif (args.merge_patches):
-        success == merge_patches(args.old_patch, args.new_patch, args.locked_fuses, args.target)
-        quit()
+        success = merge_patches(args.old_patch, args.new_patch, args.locked_fuses, args.target, args.strict)
+        return success
     elif (args.prune_patch):
         if (len(args.old_patch) == 0):
             print("ERROR: Please use the --old_patch argument to pass the path of an existing patch file.")
             success = False
-            quit()
+            return success
         elif (len(args.default_values) == 0):
             print("ERROR: Please use the --default_values argument to pass the default_fuse_values.txt file.")
             success = False
-            quit()
+            return success
 
         num_not_found = 0
         num_discarded = 0
         # num_kept = 0 - just use size of kept list
 
         kept_items = []
-        # load old patch
-        old_items = load_patch_items(args.old_patch)
-        if (len(old_items) == 0):
-            print(f"ERROR: No items loaded from {args.old_patch}")
-            quit()
-
-        # load default values
-        default_items = load_patch_items(args.default_values)
-        if (len(default_items) == 0):
+        # load default values into a name index; the old patch is streamed against it
+        default_index = index_by_name(iter_patch_items(args.default_values, strict=args.strict))
+        if (len(default_index) == 0):
             print(f"ERROR: No items loaded from {args.default_values}")
-            quit()
+            return success
+        print(f"INFO: Indexed {len(default_index)} items from file {args.default_values}")
 
         # for each value in patch, find match by name in default values
-        for cur_old in old_items:
-            find_res = find_by_name(cur_old['NAME'], default_items)
+        num_old_items = 0
+        for cur_old in iter_patch_items(args.old_patch, strict=args.strict):
+            num_old_items += 1
+            find_res = default_index.get(cur_old['NAME'])
             if (find_res is None):
                 print(f"WARNING: Unable to find {cur_old['NAME']} in {args.default_values}. Keeping.")
                 num_not_found += 1
@@ -2083,10 +2837,15 @@ if __name__ == "__main__":
                     print(f"Discarding {cur_old['NAME']} since its value 0x{cur_old['VALUE']:x} is same as default.")
                     num_discarded += 1
 
+        if (num_old_items == 0):
+            print(f"ERROR: No items loaded from {args.old_patch}")
+            return success
+        print(f"INFO: Found {num_old_items} items in file {args.old_patch}")
+
         # write keep list as target filename
         if (False == save_patch_items(target_file, kept_items)):
             print(f"ERROR: Failed to save file {target_file}")
-            quit()
+            return success
 
         # keep count of kept vs pruned items
         print(f"Items discarded from old patch: {num_discarded}")
@@ -2096,31 +2855,31 @@ if __name__ == "__main__":
         # update patch mode
         if (len(args.old_patch) == 0):
             print("ERROR: Please use the --old_patch argument to pass the path of an existing patch file.")
-            quit()
+            return success
         elif (len(args.default_values) == 0):
             print("ERROR: Please use the --default_values argument to pass the default_fuse_values.txt file.")
-            quit()
+            return success
 
         # load patch file into list. values from this list are preseved, while other fields might change
-        old_items = load_patch_items(args.old_patch)
+        old_items = load_patch_items(args.old_patch, strict=args.strict)
         if (len(old_items) == 0):
             print(f"ERROR: No items loaded from {args.old_patch}")
-            quit()
+            return success
 
         # load default_values into list. address/startbit/size of fuses come from here.
-        new_items = load_patch_items(args.default_values)
+        new_items = load_patch_items(args.default_values, strict=args.strict)
         if (len(new_items) == 0):
             print(f"ERROR: No items loaded from {args.default_values}")
-            quit()
+            return success
 
         # optionally load a list of fuses whose values should never be updated
         keep_locked = False
-        locked_fuses = []
+        locked_fuses = set()
         if (len(args.locked_fuses) > 0):
-            locked_fuses = load_fuse_names(args.locked_fuses)
+            locked_fuses = set(load_fuse_names(args.locked_fuses))
             if (len(locked_fuses) == 0):
                 print(f"ERROR: No items loaded from {args.locked_fuses}")
-                quit()
+                return success
             else:
                 keep_locked = True
 
@@ -2128,34 +2887,33 @@ if __name__ == "__main__":
         unlocked_kept = 0
         unlocked_changed = 0
         new_added = 0
+        old_index = index_by_name(old_items)
         if (len(args.imported_values) > 0):
             print(f"Importing new items from {args.imported_values}...")
-            imported_items = load_patch_items(args.imported_values)
+            imported_items = load_patch_items(args.imported_values, strict=args.strict)
             if (len(imported_items) == 0):
                 print(f"ERROR: No items loaded from {args.imported_values}")
-                quit()
+                return success
             for cur_item in imported_items:
-                found_in_old = False
-                for cur_old in old_items:
-                    if (cur_old['NAME'] == cur_item['NAME']):
-                        # found pre-existing patch item. keep that one, but allow value updates for any non-locked fuse
-                        if keep_locked:
-                            if (cur_old['NAME'] in locked_fuses):
-                                print(f"- Keeping value of locked fuse {cur_old['NAME']} (0x{cur_old['VALUE']:x})")
-                                locked_kept += 1
-                            elif (cur_old['VALUE'] != cur_item['VALUE']):
-                                # update value for non-locked fuse
-                                cur_old['VALUE'] = cur_item['VALUE']
-                                print(f"- Updating value of unlocked fuse {cur_old['NAME']} (0x{cur_old['VALUE']:x})")
-                                unlocked_changed += 1
-                            else:
-                                print(f"- No value change in unlocked fuse {cur_old['NAME']} (0x{cur_old['VALUE']:x})")
-                                unlocked_kept += 1
-                        found_in_old = True
-                        break
-                if (not found_in_old):
+                cur_old = old_index.get(cur_item['NAME'])
+                if (cur_old is not None):
+                    # found pre-existing patch item. keep that one, but allow value updates for any non-locked fuse
+                    if keep_locked:
+                        if (cur_old['NAME'] in locked_fuses):
+                            print(f"- Keeping value of locked fuse {cur_old['NAME']} (0x{cur_old['VALUE']:x})")
+                            locked_kept += 1
+                        elif (cur_old['VALUE'] != cur_item['VALUE']):
+                            # update value for non-locked fuse
+                            cur_old['VALUE'] = cur_item['VALUE']
+                            print(f"- Updating value of unlocked fuse {cur_old['NAME']} (0x{cur_old['VALUE']:x})")
+                            unlocked_changed += 1
+                        else:
+                            print(f"- No value change in unlocked fuse {cur_old['NAME']} (0x{cur_old['VALUE']:x})")
+                            unlocked_kept += 1
+                else:
                     # didn't find a pre-existing item; add this one to the patch list (will keep its value)
                     old_items.append(cur_item)
+                    old_index[cur_item['NAME']] = cur_item
                     new_added += 1
             print(f"Locked fuses with preserved values: {locked_kept}")
             print(f"Unlocked fuses with unchanged values: {unlocked_kept}")
@@ -2170,16 +2928,14 @@ if __name__ == "__main__":
         stub_items = []
         if config_out_items != None:
             for cur_cfg_item in config_out_items:
-                found_old_item = False
-                for cur_old_item in old_items:
-                    if (cur_old_item['NAME'] == cur_cfg_item['NAME']):
-                        found_old_item = True
-                        # we chould keep the existing item if it's already in the patch, but we should
-                        # also report out the difference, in case it's significant.
-                        if cur_cfg_item['VALUE'] != cur_old_item['VALUE']:
-                            print(f"NOTE: Keeping patch value 0x{cur_old_item['VALUE']:x}, instead of config value 0x{cur_cfg_item['VALUE']:x} for {cur_cfg_item['NAME']}")
-                # if item not found, add a stub entry to the old list so it gets populated at stitch time
-                if (found_old_item == False):
+                cur_old_item = old_index.get(cur_cfg_item['NAME'])
+                if (cur_old_item is not None):
+                    # we chould keep the existing item if it's already in the patch, but we should
+                    # also report out the difference, in case it's significant.
+                    if cur_cfg_item['VALUE'] != cur_old_item['VALUE']:
+                        print(f"NOTE: Keeping patch value 0x{cur_old_item['VALUE']:x}, instead of config value 0x{cur_cfg_item['VALUE']:x} for {cur_cfg_item['NAME']}")
+                else:
+                    # if item not found, add a stub entry to the old list so it gets populated at stitch time
                     new_item = {
                         "ADDR" : 0,
                         "STARTBIT" : 0,
@@ -2211,10 +2967,10 @@ if __name__ == "__main__":
             success = False
         else:
             # load patch file into list
-            old_items = load_patch_items(args.old_patch)
+            old_items = load_patch_items(args.old_patch, strict=args.strict)
 
             # load default_values into list
-            default_items = load_patch_items(args.default_values)
+            default_items = load_patch_items(args.default_values, strict=args.strict)
 
             item_pairs = []
             TYPE_EXACT = 0
@@ -2256,7 +3012,7 @@ if __name__ == "__main__":
             except:
                 print(f"ERROR: Unable to create default values file {target_file}")
                 success = False
-                quit()
+                return success
 
             outf.write("# RamAddr (hex) StartBit (dec) Width (dec) Value (hex)\n")
 
@@ -2309,20 +3065,20 @@ if __name__ == "__main__":
             success = import_blob(blob_strings, args.default_values, dlut_list, args.target, args.prefix, args.group, args.type_softstrap)
     elif (args.dump_dlut):
         success = dump_dlut(dlut_list, args.target)
-        quit()
+        return success
     elif (args.dump_ip_info):
         success = dump_ip_info(ip_info, args.target)
-        quit()
+        return success
     elif (args.print_fuse_stats):
         # next build statistics on the dlut data
         stats_list = get_stats(dlut_list)
         if (len(stats_list) == 0):
             print(f"ERROR: No stats read from {args.target} data")
-            quit()
+            return success
 
         # finally, print the resulting output
         success = print_stats(stats_list)
-        quit()
+        return success
     else:
         # lockbits mode
         constants = parse_for_constants(input_tree)
@@ -2334,7 +3090,11 @@ if __name__ == "__main__":
         lockbits = parse_for_lockbits(input_tree)
         # print(lockbits)
 
-        if (len(name_file) == 0):
+        if (len(args.sku_dir) > 0):
+            # one name file per SKU; build the whole SKU x category matrix
+            sku_rows = compute_sku_lockbits(args.sku_dir, lockbits, constants)
+            success = write_sku_lockbits_file(target_file, sku_rows, constants)
+        elif (len(name_file) == 0):
             # no name_file specified; default behavior is to dump all fuse info
             # to CSV
             success = write_csv_file(target_file, lockbits, args.names_only)
@@ -2345,4 +3105,32 @@ if __name__ == "__main__":
     if (success):
         print("Operation succeeded!")
     else:
-        print("Operation failed.")
\ No newline at end of file
+        print("Operation failed.")
+    return success
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    if (args.serve is not None):
+        # daemon mode: preload the requested models and answer requests until stopped
+        sources = args.serve
+        if (len(sources) == 0):
+            sources = [args.source]
+        daemon = FusegenDaemon(args.socket, sources)
+        daemon.serve()
+        quit()
+
+    if (not args.no_daemon):
+        # thin client mode: let a running daemon do the work if there is one
+        response = daemon_request(args.socket, {"op" : "run", "argv" : sys.argv[1:], "cwd" : os.getcwd()})
+        if (response is not None):
+            print(response.get("output", ""), end="")
+            if ("error" in response):
+                print(f"ERROR: Daemon request failed ({response['error']})")
+            quit()
+
+    try:
+        run_tool(args)
+    except PatchParseError as e:
+        print(e)
+        print("Operation failed.")
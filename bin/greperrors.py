@@ -0,0 +1,136 @@
+#!/usr/intel/bin/python3.12.3
+
+# This script extracts every case-insensitive instance of "error", "fail", "exception" or "traceback" from the
+# *.log files in one or more directories (including compressed logs), the same way the greperrors bash script
+# did with grep. Each directory gets error.txt, fail.txt, exception.txt and traceback.txt, plus combined.txt
+# (the four concatenated, in that order) and nostamps-combined.txt (combined.txt with timestamps removed).
+#
+# - Each log is read once, in large chunks. Each chunk is lowercased once and searched for each word with
+#   bytes.find, which is several times faster than a case-insensitive regex; a line with more than one of the
+#   words goes into each of their files, as with separate greps.
+# - Lines are prefixed with the log name when a directory has more than one log, as grep does.
+# - Use --subdirs to process every subdirectory of the given directories instead (what greplogs does).
+# - Directories are processed in parallel worker processes; use --jobs to set how many.
+
+import argparse # argument parsing
+import concurrent.futures # ProcessPoolExecutor
+import fnmatch # *.log matching
+import lzma # LZMAError from corrupt .xz logs
+import os # path functions
+
+from log_open import open_log, get_log_names # plain or compressed logs
+from nostamps import read_chunks, strip_timestamps_bytes # nostamps-combined.txt
+
+# words to search for, and their output files, in combined.txt order
+CATEGORIES = ["error", "fail", "exception", "traceback"]
+COMBINED_FILENAME = "combined.txt"
+NOSTAMPS_FILENAME = "nostamps-combined.txt"
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Extracts error/fail/exception/traceback lines from *.log files into TXT files.")
+    parser.add_argument('dirs', type=str, nargs='*', default=['.'], help='Directories containing *.log files. Default is the current directory.')
+    parser.add_argument('-s', '--subdirs', action='store_true', help='Process each subdirectory of the given directories instead of the directories themselves.')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='Number of directories to process in parallel. Default is the CPU count.')
+    args = parser.parse_args()
+    return args
+
+def find_logs(target_dir):
+    patterns = get_log_names("*.log")
+    logs = []
+    for entry in os.scandir(target_dir):
+        if entry.is_file() and any(fnmatch.fnmatch(entry.name, pattern) for pattern in patterns):
+            logs.append(entry.name)
+    return sorted(logs)
+
+# Writes the matching lines of one log to the category files, adding the
+# number of lines written to each category to counts.
+def grep_log(log_path, prefix, outputs, counts):
+    with open_log(log_path, "rb") as infile:
+        for chunk in read_chunks(infile):
+            # lower() only changes ASCII letters, so offsets in lower_chunk are offsets in chunk
+            lower_chunk = chunk.lower()
+            for name in CATEGORIES:
+                word = name.encode("ascii")
+                pos = lower_chunk.find(word)
+                while (pos != -1):
+                    start = lower_chunk.rfind(b"\n", 0, pos) + 1
+                    end = lower_chunk.find(b"\n", pos)
+                    end = len(chunk) if (end == -1) else end + 1
+                    line = chunk[start:end]
+                    if (not line.endswith(b"\n")):
+                        line += b"\n"
+                    outputs[name].write(prefix + line)
+                    counts[name] += 1
+                    # one output line per log line, however many times the word is on it
+                    pos = lower_chunk.find(word, end)
+
+# Runs in worker processes: extracts the lines from all logs in target_dir.
+# Returns (number of logs, line counts per category, unreadable logs, error).
+# A log that can't be read (e.g. a truncated .gz) is recorded and skipped;
+# the lines read from it before the failure are kept.
+def grep_dir(target_dir):
+    counts = dict.fromkeys(CATEGORIES, 0)
+    bad_logs = []
+    try:
+        logs = find_logs(target_dir)
+        outputs = {name : open(os.path.join(target_dir, f"{name}.txt"), "wb") for name in CATEGORIES}
+        try:
+            for log_name in logs:
+                prefix = (log_name + ":").encode() if (len(logs) > 1) else b""
+                try:
+                    grep_log(os.path.join(target_dir, log_name), prefix, outputs, counts)
+                except (OSError, EOFError, lzma.LZMAError) as e:
+                    bad_logs.append((log_name, str(e)))
+        finally:
+            for outfile in outputs.values():
+                outfile.close()
+
+        # only the extracted lines are read again here, never the logs
+        with open(os.path.join(target_dir, COMBINED_FILENAME), "wb") as combined, open(os.path.join(target_dir, NOSTAMPS_FILENAME), "wb") as nostamps:
+            for name in CATEGORIES:
+                with open(os.path.join(target_dir, f"{name}.txt"), "rb") as infile:
+                    for chunk in read_chunks(infile):
+                        combined.write(chunk)
+                        nostamps.write(strip_timestamps_bytes(chunk))
+    except OSError as e:
+        return 0, counts, bad_logs, f"{e.strerror} ({e.filename})"
+    return len(logs), counts, bad_logs, None
+
+def get_target_dirs(dirs, subdirs):
+    target_dirs = []
+    for cur_dir in dirs:
+        if (not os.path.isdir(cur_dir)):
+            print(f"ERROR: {cur_dir} does not exist or is not a directory!")
+            continue
+        if (not subdirs):
+            target_dirs.append(cur_dir)
+            continue
+        for entry in sorted(os.scandir(cur_dir), key=lambda entry: entry.name):
+            if entry.is_dir():
+                target_dirs.append(entry.path)
+    return target_dirs
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    target_dirs = get_target_dirs(args.dirs, args.subdirs)
+    if (args.jobs is None) or (args.jobs <= 1) or (len(target_dirs) <= 1):
+        results = map(grep_dir, target_dirs)
+        executor = None
+    else:
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=args.jobs)
+        results = executor.map(grep_dir, target_dirs)
+
+    for cur_dir, (num_logs, counts, bad_logs, error) in zip(target_dirs, results):
+        for log_name, log_error in bad_logs:
+            print(f"ERROR: Unable to read {os.path.join(cur_dir, log_name)}: {log_error}")
+        if (error is not None):
+            print(f"ERROR: Unable to process {cur_dir}: {error}")
+            continue
+        if (num_logs == 0):
+            print(f"WARNING: No *.log files found in {cur_dir}.")
+        summary = ", ".join(f"{counts[name]} {name}" for name in CATEGORIES)
+        print(f"Created text files in {cur_dir} from {num_logs} logs ({summary}).")
+
+    if (executor is not None):
+        executor.shutdown()
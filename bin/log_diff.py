@@ -0,0 +1,233 @@
+from array import array # compact line hash storage
+import bisect # patience sorting
+import difflib # small-range fallback
+
+# Ordered diff for large logs. Each line is normalized (by the caller) and
+# hashed to a 64-bit integer, and the hashes are kept in array('Q'), so a
+# million-line log takes 8 MB instead of a list of strings. The diff itself
+# runs on the integers:
+#
+# - Common prefixes and suffixes are matched directly.
+# - Patience diff: lines that occur exactly once in both ranges are matched
+#   along their longest increasing subsequence, and the gaps between those
+#   anchors are diffed the same way.
+# - Where no line is unique (repetitive log output), small ranges go to
+#   difflib, and larger ones are split at the least frequent common line,
+#   as histogram diff does.
+#
+# Matching hashes are treated as matching lines; with 64-bit hashes a false
+# match is vanishingly unlikely. Output is unified diff hunks, with the
+# original (un-normalized) lines read back from the files in a second pass.
+
+HASH_MASK = 0xFFFFFFFFFFFFFFFF
+# largest (lines in a) * (lines in b) handed to difflib
+DIFFLIB_LIMIT = 1000000
+
+def hash_lines(lines):
+    hashes = array('Q')
+    for cur_line in lines:
+        hashes.append(hash(cur_line) & HASH_MASK)
+    return hashes
+
+def count_range(hashes, lo, hi):
+    # hash -> [count, first index]
+    counts = {}
+    for index in range(lo, hi):
+        entry = counts.get(hashes[index])
+        if (entry is None):
+            counts[hashes[index]] = [1, index]
+        else:
+            entry[0] += 1
+    return counts
+
+def longest_increasing(pairs):
+    # pairs are sorted by a index; return the longest run with increasing b index (patience sorting)
+    tails = []
+    tail_pairs = []
+    back = []
+    for ia, ib in pairs:
+        pos = bisect.bisect_left(tails, ib)
+        back.append(tail_pairs[pos - 1] if (pos > 0) else -1)
+        if (pos == len(tails)):
+            tails.append(ib)
+            tail_pairs.append(len(back) - 1)
+        else:
+            tails[pos] = ib
+            tail_pairs[pos] = len(back) - 1
+    result = []
+    index = tail_pairs[-1] if (len(tail_pairs) > 0) else -1
+    while (index != -1):
+        result.append(pairs[index])
+        index = back[index]
+    result.reverse()
+    return result
+
+def find_anchors(a, b, alo, ahi, blo, bhi):
+    counts_a = count_range(a, alo, ahi)
+    counts_b = count_range(b, blo, bhi)
+
+    unique = []
+    for value, (count, index) in counts_a.items():
+        if (count == 1):
+            entry = counts_b.get(value)
+            if (entry is not None) and (entry[0] == 1):
+                unique.append((index, entry[1]))
+    if (len(unique) > 0):
+        unique.sort()
+        return longest_increasing(unique)
+
+    # no unique lines: anchor on the least frequent line common to both
+    best = None
+    best_count = 0
+    for value, (count, index) in counts_a.items():
+        entry = counts_b.get(value)
+        if (entry is not None) and ((best is None) or (count + entry[0] < best_count)):
+            best = (index, entry[1])
+            best_count = count + entry[0]
+    if (best is None):
+        return []
+    return [best]
+
+# Returns an array where entry i is the index of the line in b matched to
+# line i of a, or -1 if line i was deleted.
+def match_lines(a, b):
+    matches = array('q', [-1]) * len(a)
+    stack = [(0, len(a), 0, len(b))]
+    while (len(stack) > 0):
+        alo, ahi, blo, bhi = stack.pop()
+        while (alo < ahi) and (blo < bhi) and (a[alo] == b[blo]):
+            matches[alo] = blo
+            alo += 1
+            blo += 1
+        while (alo < ahi) and (blo < bhi) and (a[ahi - 1] == b[bhi - 1]):
+            ahi -= 1
+            bhi -= 1
+            matches[ahi] = bhi
+        if (alo >= ahi) or (blo >= bhi):
+            continue
+
+        if ((ahi - alo) * (bhi - blo) <= DIFFLIB_LIMIT):
+            matcher = difflib.SequenceMatcher(None, a[alo:ahi], b[blo:bhi], autojunk=False)
+            for ia, ib, size in matcher.get_matching_blocks():
+                for offset in range(size):
+                    matches[alo + ia + offset] = blo + ib + offset
+            continue
+
+        anchors = find_anchors(a, b, alo, ahi, blo, bhi)
+        prev_a = alo
+        prev_b = blo
+        for ia, ib in anchors:
+            matches[ia] = ib
+            stack.append((prev_a, ia, prev_b, ib))
+            prev_a = ia + 1
+            prev_b = ib + 1
+        if (len(anchors) > 0):
+            stack.append((prev_a, ahi, prev_b, bhi))
+    return matches
+
+# difflib-style opcodes: (tag, i1, i2, j1, j2) with tag equal/replace/delete/insert
+def get_opcodes(matches, len_b):
+    opcodes = []
+    i = 0
+    j = 0
+    len_a = len(matches)
+    while (i < len_a) or (j < len_b):
+        if (i < len_a) and (matches[i] == j):
+            i1, j1 = i, j
+            while (i < len_a) and (matches[i] == j):
+                i += 1
+                j += 1
+            opcodes.append(("equal", i1, i, j1, j))
+            continue
+        i1, j1 = i, j
+        while (i < len_a) and (matches[i] == -1):
+            i += 1
+        # everything in b before the next match was inserted
+        next_b = matches[i] if (i < len_a) else len_b
+        while (j < next_b):
+            j += 1
+        if (i > i1) and (j > j1):
+            opcodes.append(("replace", i1, i, j1, j))
+        elif (i > i1):
+            opcodes.append(("delete", i1, i, j1, j))
+        elif (j > j1):
+            opcodes.append(("insert", i1, i, j1, j))
+    return opcodes
+
+# Same grouping as difflib.SequenceMatcher.get_grouped_opcodes
+def group_opcodes(opcodes, context):
+    if (len(opcodes) == 0) or ((len(opcodes) == 1) and (opcodes[0][0] == "equal")):
+        return []
+    codes = list(opcodes)
+    if (codes[0][0] == "equal"):
+        tag, i1, i2, j1, j2 = codes[0]
+        codes[0] = (tag, max(i1, i2 - context), i2, max(j1, j2 - context), j2)
+    if (codes[-1][0] == "equal"):
+        tag, i1, i2, j1, j2 = codes[-1]
+        codes[-1] = (tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context))
+
+    groups = []
+    group = []
+    for tag, i1, i2, j1, j2 in codes:
+        if (tag == "equal") and (i2 - i1 > context * 2):
+            group.append((tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)))
+            groups.append(group)
+            group = []
+            i1, j1 = max(i1, i2 - context), max(j1, j2 - context)
+        group.append((tag, i1, i2, j1, j2))
+    if (len(group) > 0) and (not ((len(group) == 1) and (group[0][0] == "equal"))):
+        groups.append(group)
+    return groups
+
+def format_range(start, stop):
+    # same as difflib's unified range format
+    beginning = start + 1
+    length = stop - start
+    if (length == 1):
+        return f"{beginning}"
+    if (length == 0):
+        beginning -= 1
+    return f"{beginning},{length}"
+
+class LineReader:
+    # reads lines forward from an iterator, by index, without keeping old lines
+    def __init__(self, lines):
+        self.lines = iter(lines)
+        self.index = 0
+
+    def read(self, start, stop):
+        result = []
+        while (self.index < stop):
+            cur_line = next(self.lines, "")
+            if (self.index >= start):
+                result.append(cur_line)
+            self.index += 1
+        return result
+
+# Yields unified diff lines. hashes1/hashes2 are the normalized line hashes;
+# lines1/lines2 are fresh iterators over the original lines of each file.
+def unified_diff(hashes1, hashes2, lines1, lines2, name1, name2, context = 3):
+    matches = match_lines(hashes1, hashes2)
+    groups = group_opcodes(get_opcodes(matches, len(hashes2)), context)
+    if (len(groups) == 0):
+        return
+
+    yield f"--- {name1}"
+    yield f"+++ {name2}"
+    reader1 = LineReader(lines1)
+    reader2 = LineReader(lines2)
+    for group in groups:
+        first = group[0]
+        last = group[-1]
+        yield f"@@ -{format_range(first[1], last[2])} +{format_range(first[3], last[4])} @@"
+        old_lines = reader1.read(first[1], last[2])
+        new_lines = reader2.read(first[3], last[4])
+        for tag, i1, i2, j1, j2 in group:
+            if (tag == "equal"):
+                for cur_line in old_lines[i1 - first[1]:i2 - first[1]]:
+                    yield " " + cur_line
+                continue
+            for cur_line in old_lines[i1 - first[1]:i2 - first[1]]:
+                yield "-" + cur_line
+            for cur_line in new_lines[j1 - first[3]:j2 - first[3]]:
+                yield "+" + cur_line
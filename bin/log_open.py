@@ -0,0 +1,140 @@
+import bz2 # bz2 logs
+import codecs # BOMs, incremental UTF-8 check
+import gzip # gzip logs
+import io # text wrapper over the detection sample
+import lzma # xz logs
+
+# Shared open layer for the log tools. Archived logs are often compressed to
+# save NFS quota; open_log detects gzip, xz and bz2 by their magic bytes (not
+# the file extension) and returns a stream that decompresses as it's read, so
+# the tools work on compressed archives without unpacking them first.
+#
+# open_log_text also detects the text encoding (BOM, UTF-16, UTF-8) from a
+# single sample, which the returned stream then reuses instead of reopening.
+
+COMPRESSION_GZIP = "gzip"
+COMPRESSION_XZ = "xz"
+COMPRESSION_BZ2 = "bz2"
+
+# (magic bytes, compression type, open function)
+COMPRESSION_MAGIC = [
+    (b"\x1f\x8b", COMPRESSION_GZIP, gzip.open),
+    (b"\xfd7zXZ\x00", COMPRESSION_XZ, lzma.open),
+    (b"BZh", COMPRESSION_BZ2, bz2.open)
+]
+
+# Encoding detection reads this much (decompressed) data from the start of the file
+ENCODING_SAMPLE_SIZE = 64 * 1024
+
+# checked in order, so the UTF-32 BOMs come before the UTF-16 ones they start with
+ENCODING_BOMS = [
+    (codecs.BOM_UTF8, "utf_8_sig"),
+    (codecs.BOM_UTF32_LE, "utf_32"),
+    (codecs.BOM_UTF32_BE, "utf_32"),
+    (codecs.BOM_UTF16_LE, "utf_16"),
+    (codecs.BOM_UTF16_BE, "utf_16")
+]
+
+# extensions compressed logs are archived with (test.log.gz etc.), for file searches
+COMPRESSED_EXTENSIONS = [".gz", ".xz", ".bz2"]
+
+def get_compression(filename):
+    with open(filename, "rb") as f:
+        header = f.read(6)
+    for magic, compression, open_func in COMPRESSION_MAGIC:
+        if header.startswith(magic):
+            return compression
+    return None
+
+def is_compressed(filename):
+    return get_compression(filename) is not None
+
+# Returns the names a log may be stored under: the plain name plus its
+# compressed variants.
+def get_log_names(filename):
+    return [filename] + [filename + ext for ext in COMPRESSED_EXTENSIONS]
+
+# Opens a plain or compressed log. mode is "r"/"rt" for text or "rb" for
+# bytes; encoding, errors and newline only apply to text mode, as with open().
+def open_log(filename, mode="r", encoding=None, errors=None, newline=None):
+    binary = "b" in mode
+    compression = get_compression(filename)
+    if (compression is None):
+        if (binary):
+            return open(filename, "rb")
+        return open(filename, "r", encoding=encoding, errors=errors, newline=newline)
+
+    for magic, cur_compression, open_func in COMPRESSION_MAGIC:
+        if (cur_compression == compression):
+            if (binary):
+                return open_func(filename, "rb")
+            return open_func(filename, "rt", encoding=encoding, errors=errors, newline=newline)
+
+# Decides the encoding of a binary stream from one sample read from its start:
+# a BOM if there is one, then BOM-less UTF-16 (ASCII text with a NUL in every
+# other byte), then UTF-8, validated incrementally so a character cut off at
+# the end of the sample doesn't count as an error. Other NUL-free data is
+# taken as latin_1; anything else with NULs isn't text, and gets None.
+# Returns (encoding, sample), so the sample doesn't have to be read again.
+def detect_encoding(f):
+    sample = f.read(ENCODING_SAMPLE_SIZE)
+    for bom, encoding in ENCODING_BOMS:
+        if sample.startswith(bom):
+            return encoding, sample
+
+    nuls = sample.count(b"\x00")
+    if (nuls > 0):
+        # little endian ASCII has its NULs at odd offsets, big endian at even ones
+        odd_nuls = sample[1::2].count(b"\x00")
+        if (nuls * 4 >= len(sample)):
+            if (odd_nuls * 10 >= nuls * 9):
+                return "utf_16_le", sample
+            if ((nuls - odd_nuls) * 10 >= nuls * 9):
+                return "utf_16_be", sample
+        return None, sample
+
+    decoder = codecs.getincrementaldecoder("utf_8")()
+    try:
+        decoder.decode(sample, final=(len(sample) < ENCODING_SAMPLE_SIZE))
+    except UnicodeDecodeError:
+        return "latin_1", sample
+    return "utf_8", sample
+
+class SampleReader(io.RawIOBase):
+    # returns the detection sample, then the rest of the stream it came from
+    def __init__(self, sample, f):
+        self.sample = sample
+        self.pos = 0
+        self.f = f
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if (self.pos < len(self.sample)):
+            size = min(len(buffer), len(self.sample) - self.pos)
+            buffer[:size] = self.sample[self.pos:self.pos + size]
+            self.pos += size
+            return size
+        return self.f.readinto(buffer)
+
+    def close(self):
+        self.f.close()
+        super().close()
+
+# Opens a plain or compressed log as bytes and detects its encoding. Returns
+# (binary stream from the start of the file, encoding or None); the sample is
+# only read from the file once.
+def open_log_detect(filename):
+    f = open_log(filename, "rb")
+    encoding, sample = detect_encoding(f)
+    return io.BufferedReader(SampleReader(sample, f)), encoding
+
+# Opens a log as text in its detected encoding. Returns (text stream,
+# encoding), or (None, None) if the file doesn't look like text.
+def open_log_text(filename, errors=None, newline=None):
+    stream, encoding = open_log_detect(filename)
+    if (encoding is None):
+        stream.close()
+        return None, None
+    return io.TextIOWrapper(stream, encoding=encoding, errors=errors, newline=newline), encoding
@@ -0,0 +1,156 @@
+import mmap # memory-mapped file access
+import os # for fstat
+
+from log_open import open_log, is_compressed # compressed log support
+
+# Single-pass scanner for Simics test.log files. The log is memory-mapped, so
+# finding the run_target lines and the "### SUMMARY" block doesn't require
+# reading the file line by line or decoding it to str. Only the matching lines
+# and the summary block are decoded.
+#
+# When only the summary is wanted, plain logs are read backwards in large
+# aligned blocks until the "### SUMMARY" header turns up, so the cost depends
+# on the size of the summary, not the log.
+#
+# Compressed logs can't be mapped or read backwards, so they're decompressed
+# as a stream in a single forward pass instead.
+
+RUN_TARGET_MARKER = b"[sim info] run_target("
+SUMMARY_MARKER = b"### SUMMARY"
+
+# decompressed bytes read at a time when only the summary is wanted
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+# block size for reading plain logs backwards
+REVERSE_BLOCK_SIZE = 64 * 1024
+
+def get_line_bounds(mm, pos, size):
+    # start of the line containing pos, and end of that line (excluding newline)
+    line_start = mm.rfind(b"\n", 0, pos) + 1
+    line_end = mm.find(b"\n", pos)
+    if (line_end == -1):
+        line_end = size
+    return line_start, line_end
+
+def find_marker_lines(mm, marker, size):
+    lines = []
+    start = 0
+    while True:
+        pos = mm.find(marker, start)
+        if (pos == -1):
+            break
+        line_start, line_end = get_line_bounds(mm, pos, size)
+        lines.append(mm[line_start:line_end].decode("utf-8", errors="replace").strip())
+        start = line_end + 1
+    return lines
+
+def find_summary_lines(mm, size):
+    # the summary is at the end of the log; search backwards for its header
+    pos = mm.rfind(SUMMARY_MARKER)
+    if (pos == -1):
+        return []
+    line_start, line_end = get_line_bounds(mm, pos, size)
+    return mm[line_start:size].decode("utf-8", errors="replace").splitlines()
+
+def decode_lines(data):
+    return data.decode("utf-8", errors="replace").splitlines()
+
+# Tail strategy for compressed logs: decompress in large chunks and only keep
+# bytes from the latest summary header on (or the trailing partial line, in
+# case the header straddles a chunk boundary). No per-line work is done.
+def find_stream_summary_lines(f):
+    keep = b""
+    in_summary = False
+    while True:
+        chunk = f.read(STREAM_CHUNK_SIZE)
+        if (len(chunk) == 0):
+            break
+        buffer = keep + chunk
+        pos = buffer.rfind(SUMMARY_MARKER)
+        if (pos != -1):
+            in_summary = True
+            keep = buffer[buffer.rfind(b"\n", 0, pos) + 1:]
+        elif (in_summary):
+            keep = buffer
+        else:
+            keep = buffer[buffer.rfind(b"\n") + 1:]
+    if (not in_summary):
+        return []
+    return decode_lines(keep)
+
+# Reads f (a binary file of the given size) backwards until it has the whole
+# line holding the last "### SUMMARY" header, and returns the summary lines.
+# Works in bytes throughout and only decodes the summary slice, so a block
+# boundary in the middle of a multi-byte character doesn't matter.
+def read_summary_reverse(f, size):
+    data = b""
+    # the first read runs from the last block boundary to the end, so every
+    # read after it is a full aligned block
+    end = size
+    start = ((size - 1) // REVERSE_BLOCK_SIZE) * REVERSE_BLOCK_SIZE
+    marker_pos = -1
+    while (end > 0):
+        f.seek(start)
+        block = f.read(end - start)
+        data = block + data
+        if (marker_pos == -1):
+            # only search the new block, plus enough of the old data to catch a marker split across the boundary
+            marker_pos = data.rfind(SUMMARY_MARKER, 0, len(block) + len(SUMMARY_MARKER) - 1)
+        else:
+            marker_pos += len(block)
+        if (marker_pos != -1):
+            line_start = data.rfind(b"\n", 0, marker_pos)
+            if (line_start != -1) or (start == 0):
+                return decode_lines(data[line_start + 1:])
+        end = start
+        start = max(0, start - REVERSE_BLOCK_SIZE)
+    return []
+
+def read_summary_lines(filename):
+    if is_compressed(filename):
+        with open_log(filename, "rb") as f:
+            return find_stream_summary_lines(f)
+    with open(filename, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        return read_summary_reverse(f, size)
+
+def scan_stream(f):
+    target_lines = []
+    summary = None
+    for line in f:
+        if (RUN_TARGET_MARKER in line):
+            target_lines.append(line.decode("utf-8", errors="replace").strip())
+        if (SUMMARY_MARKER in line):
+            # a later summary replaces an earlier one, like rfind on a mapped file
+            summary = [line]
+        elif (summary is not None):
+            summary.append(line)
+    if (summary is None):
+        return target_lines, []
+    return target_lines, decode_lines(b"".join(summary))
+
+# Returns (run_target_lines, summary_lines) for the given log. run_target lines
+# are stripped; summary lines start with the "### SUMMARY" line and run to the
+# end of the file. Pass want_targets=False to skip the run_target search when
+# only the summary is needed.
+def scan_log(filename, want_targets=True):
+    target_lines = []
+    summary_lines = []
+
+    if (not want_targets):
+        return target_lines, read_summary_lines(filename)
+
+    if is_compressed(filename):
+        with open_log(filename, "rb") as f:
+            return scan_stream(f)
+
+    with open(filename, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if (size == 0):
+            # can't mmap an empty file
+            return target_lines, summary_lines
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            target_lines = find_marker_lines(mm, RUN_TARGET_MARKER, size)
+            summary_lines = find_summary_lines(mm, size)
+
+    return target_lines, summary_lines
@@ -0,0 +1,38 @@
+import hashlib # template fingerprints
+import re # masking
+
+from nostamps import strip_timestamps # known timestamp formats
+
+# Turns log lines into templates by removing timestamps (the nostamps.py
+# formats) and masking the parts that change from run to run: paths, hex
+# values and numbers. Lines that only differ in addresses, counters or file
+# locations end up with the same template, and so the same fingerprint.
+
+# One pass over the line; the first alternative that matches at a position
+# wins, so paths are masked before the numbers inside them.
+MASK_PATTERN = re.compile(r"""
+    (?P<path>(?:[A-Za-z]:)?(?:[\\/][\w.+-]+){2,}[\\/]?)
+    |(?P<hex>\b0[xX][0-9a-fA-F]+\b|\b(?=[0-9a-fA-F]*\d)(?=[0-9a-fA-F]*[a-fA-F])[0-9a-fA-F]{8,}\b)
+    |(?P<num>\d+(?:\.\d+)?)
+    """, re.VERBOSE)
+
+MASKS = {
+    "path" : "<PATH>",
+    "hex" : "<HEX>",
+    "num" : "<NUM>"
+}
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+def mask_match(match):
+    return MASKS[match.lastgroup]
+
+def make_template(line):
+    template = strip_timestamps(line)
+    template = MASK_PATTERN.sub(mask_match, template)
+    return WHITESPACE_PATTERN.sub(" ", template).strip()
+
+# short stable id for a template, so results from different runs and
+# processes can be matched up without passing the template text around
+def get_fingerprint(template):
+    return hashlib.blake2b(template.encode("utf-8"), digest_size=8).hexdigest()
@@ -1,68 +1,179 @@
 #!/usr/intel/bin/python3.7.4
 
+# This script counts the unique lines containing one or more search strings in one or more log files (or any text
+# files). Directories are searched recursively for *.log files (including compressed ones). For each search string
+# it prints each matching line with its number of instances, most frequent first.
+#
+# - With one search string and one file, the output is the original LINE:/INSTANCES: list in the order the lines
+#   first appear, with no per-string header, so existing scripts parsing it keep working.
+# - Use -e to add more search strings; every file is read once for all of them, and a line containing several
+#   of them is counted for each.
+# - Use --nostamps to count lines with their timestamps removed, or --templates to also mask paths, hex values
+#   and numbers (see log_templates.py), so lines that only differ in those are counted together.
+# - Use --top to only print the most frequent lines of each search string.
+# - Files are read in worker processes; use --jobs to set how many.
+
 import argparse
+import concurrent.futures # ProcessPoolExecutor
 import os.path
-from subprocess import run
+import re # search strings
+from collections import Counter # line counts
+
+from file_walker import find_files # recursive scandir search
+from log_open import open_log_text, get_log_names # plain or compressed files, encoding detection
+from log_templates import make_template # --templates
+from nostamps import read_chunks, strip_timestamps # chunked reads, --nostamps
+
+NORMALIZE_NONE = "none"
+NORMALIZE_NOSTAMPS = "nostamps"
+NORMALIZE_TEMPLATES = "templates"
 
 def parse_args():
-    parser = argparse.ArgumentParser(description="Packages and uploads fusegen XML files.")
+    parser = argparse.ArgumentParser(description="Counts the unique lines containing the given strings in log files.")
     parser.add_argument('search_string', type=str,
-                        help='String you would like to search for in the given text file.')
-    parser.add_argument('log_file', type=str,
-                        help='Path to log file (or any text file) you would like to search for a given substring.')
+                        help='String you would like to search for in the given text files.')
+    parser.add_argument('log_files', type=str, nargs='+',
+                        help='Paths to log files (or any text files) to search. Directories are searched recursively for *.log files.')
+    parser.add_argument('-e', '--search', type=str, action='append', default=[],
+                        help='Additional string to search for. Can be given more than once.')
     parser.add_argument('--ignore_case', action='store_true',
                         required=False,
                         help='Indicates whether searches should be case-insensitive. (Default = False; case-sensitive.)')
+    parser.add_argument('-n', '--nostamps', action='store_true',
+                        help='Remove timestamps from lines before counting them.')
+    parser.add_argument('--templates', action='store_true',
+                        help='Count line templates (timestamps removed; paths, hex values and numbers masked) instead of lines.')
+    parser.add_argument('--top', type=int, default=0,
+                        help='Only print the N most frequent lines of each search string. (Default = 0; print all.)')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                        help='Number of worker processes used to read files. (Default = CPU count.)')
     args = parser.parse_args()
     return args
 
-def load_text_file(filepath):
-    items = []
-    try:
-        inf = open(filepath, "r")
-    except:
-        print(f"ERROR: Unable to open input file {filepath}")
-        return items
+class LineSearch:
+    def __init__(self, search_strings, ignore_case, normalize):
+        flags = re.IGNORECASE if ignore_case else 0
+        self.search_strings = search_strings
+        self.normalize = normalize
+        # One pattern finds the lines containing any of the strings. The named groups only say which string
+        # matched first, so the line is then checked for each string on its own: otherwise a string that
+        # overlaps another one on the same line ("err", "error") would be missed.
+        self.any_pattern = re.compile("|".join(f"(?P<s{index}>{re.escape(cur_string)})" for index, cur_string in enumerate(search_strings)), flags)
+        self.patterns = [re.compile(re.escape(cur_string), flags) for cur_string in search_strings]
 
-    items = inf.readlines()
-    inf.close()
-    return items
+    def get_key(self, line):
+        if (self.normalize == NORMALIZE_TEMPLATES):
+            return make_template(line)
+        if (self.normalize == NORMALIZE_NOSTAMPS):
+            return strip_timestamps(line).strip()
+        return line
+
+    # Reads one file in chunks. Returns (a Counter of matching lines for each
+    # search string, error). Runs in worker processes, so it never raises.
+    def search_file(self, filename):
+        found_items = [Counter() for cur_string in self.search_strings]
+        try:
+            inf, encoding = open_log_text(filename, errors="replace")
+            if (inf is None):
+                return found_items, "not a text file"
+            with inf:
+                for chunk in read_chunks(inf):
+                    pos = 0
+                    while True:
+                        match = self.any_pattern.search(chunk, pos)
+                        # an empty search string matches (zero-width) at the end of the chunk, where there's no line
+                        if (match is None) or (match.start() >= len(chunk)):
+                            break
+                        start = chunk.rfind("\n", 0, match.start()) + 1
+                        end = chunk.find("\n", match.end())
+                        end = len(chunk) if (end == -1) else end + 1
+                        cur_line = chunk[start:end].strip("\n")
+                        key = self.get_key(cur_line)
+                        first_index = int(match.lastgroup[1:])
+                        found_items[first_index][key] += 1
+                        for index, pattern in enumerate(self.patterns):
+                            if (index != first_index) and (pattern.search(cur_line) is not None):
+                                found_items[index][key] += 1
+                        pos = end
+        except Exception as e:
+            return found_items, repr(e)
+        return found_items, None
+
+def find_logs(paths):
+    filelist = []
+    for cur_path in paths:
+        if os.path.isdir(cur_path):
+            filelist.extend(sorted(find_files(cur_path, get_log_names("*.log"))))
+        elif os.path.exists(cur_path):
+            filelist.append(cur_path)
+        else:
+            print(f"ERROR: File {cur_path} not found!")
+    return filelist
+
+def search_files(search, filelist, jobs):
+    totals = [Counter() for cur_string in search.search_strings]
+    if (jobs is None) or (jobs <= 1) or (len(filelist) <= 1):
+        results = map(search.search_file, filelist)
+        executor = None
+    else:
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=jobs)
+        results = executor.map(search.search_file, filelist)
+
+    for filename, (found_items, error) in zip(filelist, results):
+        if (error is not None):
+            print(f"ERROR: Unable to read input file {filename}: {error}")
+            continue
+        for index, cur_items in enumerate(found_items):
+            totals[index].update(cur_items)
+
+    if (executor is not None):
+        executor.shutdown()
+    return totals
+
+# Prints the lines found for one search string. In single mode (one string,
+# one file) this is the original output: no header and no trailing blank line,
+# and lines in the order they were first seen unless --top is given.
+def print_items(search_string, found_items, max_num, single = False):
+    if (not single):
+        instances = sum(found_items.values())
+        print(f"Search string {search_string}: {instances} instances")
+    if (single) and (max_num <= 0):
+        items = list(found_items.items())
+    else:
+        items = found_items.most_common(max_num if (max_num > 0) else None)
+    for cur_item, cur_count in items:
+        print(f"LINE: {cur_item}, INSTANCES: {cur_count}")
+    if (len(found_items) > len(items)):
+        print(f"... and {len(found_items) - len(items)} more lines")
+    print(f"Unique lines containing {search_string}: {len(found_items)}")
+    if (not single):
+        print("")
 
 
 if __name__ == "__main__":
     args = parse_args()
 
-    if (not os.path.exists(args.log_file)):
-        print(f"ERROR: File {args.log_file} not found!")
+    filelist = find_logs(args.log_files)
+    if (len(filelist) == 0):
+        print("ERROR: No files to search!")
         exit(1)
 
-    lines = load_text_file(args.log_file)
-    if (len(lines) == 0):
-        print(f"ERROR: No lines read from {args.log_file}")
-        exit(1)
+    normalize = NORMALIZE_NONE
+    if (args.templates):
+        normalize = NORMALIZE_TEMPLATES
+    elif (args.nostamps):
+        normalize = NORMALIZE_NOSTAMPS
+    search_strings = [args.search_string] + args.search
+    search = LineSearch(search_strings, args.ignore_case, normalize)
+    totals = search_files(search, filelist, args.jobs)
 
-    found_items = {}
-    for cur_line in lines:
-        fresult = -1
-        if (args.ignore_case):
-            fresult = cur_line.lower().find(args.search_string.lower())
+    single = (len(search_strings) == 1) and (len(args.log_files) == 1) and (filelist == args.log_files)
+    if (sum(len(found_items) for found_items in totals) == 0):
+        if (single):
+            print(f"Did not find any instances of {args.search_string} in {filelist[0]}")
         else:
-            fresult = cur_line.find(args.search_string)
-        if (fresult != -1):
-            cur_count = 0
-            new_line = cur_line.strip("\n")
-            try:
-                # get existing value, if any
-                cur_count = found_items[new_line]
-            except KeyError:
-                # it's okay; just haven't added this line yet
-                cur_count = 0
-            found_items[new_line] = (cur_count + 1)
-
-    if (len(found_items) == 0):
-        print(f"Did not find any instances of {args.search_string} in {args.log_file}")
+            print(f"Did not find any instances of {', '.join(search_strings)} in {len(filelist)} files")
         exit(1)
 
-    for cur_item in found_items:
-        print(f"LINE: {cur_item}, INSTANCES: {found_items[cur_item]}")
-    print(f"Unique lines containing {args.search_string}: {len(found_items)}")
+    for search_string, found_items in zip(search_strings, totals):
+        print_items(search_string, found_items, args.top, single)
@@ -0,0 +1,115 @@
+import ast # literal_eval fallback
+import functools # lru_cache
+import re # item matching
+
+# Parser for the preset_params dict on "[sim info] run_target(" lines, e.g.
+#   preset_params {'fmod': 'fmodA', 'threads': 3, 'name': 'cfg0', 'flag': True}
+#
+# These are Python literals, but nearly always a flat dict of strings,
+# numbers and booleans, which one compiled regex can walk much faster than
+# ast.literal_eval can build and evaluate a syntax tree. Anything the regex
+# doesn't understand (nested containers, escapes, expressions) falls back to
+# literal_eval. The same params line repeats across hundreds of logs, so
+# parsed lines are also cached.
+
+BMOD_NAME = "(BMOD)"
+
+# one "key: value" pair plus the following "," or "}"
+ITEM_PATTERN = re.compile(r"""
+    \s*(?:'(?P<skey>[^'\\]*)'|"(?P<dkey>[^"\\]*)")\s*:\s*
+    (?:'(?P<sstr>[^'\\]*)'
+      |"(?P<dstr>[^"\\]*)"
+      |(?P<hex>-?0[xX][0-9a-fA-F]+)
+      |(?P<float>-?\d+\.\d*(?:[eE][-+]?\d+)?)
+      |(?P<int>-?(?:0|[1-9]\d*))
+      |(?P<const>True|False|None))
+    \s*(?P<end>[,}])""", re.VERBOSE)
+
+CONSTANTS = {"True" : True, "False" : False, "None" : None}
+
+def get_item_value(match):
+    value = match.group("sstr")
+    if (value is not None):
+        return value
+    value = match.group("dstr")
+    if (value is not None):
+        return value
+    value = match.group("int")
+    if (value is not None):
+        return int(value)
+    value = match.group("float")
+    if (value is not None):
+        return float(value)
+    value = match.group("hex")
+    if (value is not None):
+        return int(value, 16)
+    return CONSTANTS[match.group("const")]
+
+# Returns the dict for the simple flat case, or None if the text needs the
+# full literal_eval.
+def parse_flat_dict(text):
+    text = text.strip()
+    if (not text.startswith("{")):
+        return None
+    if (text[1:].strip() == "}"):
+        return {}
+
+    result = {}
+    pos = 1
+    while True:
+        match = ITEM_PATTERN.match(text, pos)
+        if (match is None):
+            return None
+        key = match.group("skey")
+        if (key is None):
+            key = match.group("dkey")
+        result[key] = get_item_value(match)
+        pos = match.end()
+        if (match.group("end") == "}"):
+            break
+        # allow a trailing comma before the closing brace
+        if (text[pos:].strip() == "}"):
+            pos = len(text)
+            break
+
+    # anything after the closing brace makes this not a plain dict literal
+    if (text[pos:].strip() != ""):
+        return None
+    return result
+
+@functools.lru_cache(maxsize=4096)
+def parse_cached(text):
+    result = parse_flat_dict(text)
+    if (result is None):
+        result = ast.literal_eval(text)
+    return result
+
+# Parses the text after "preset_params ". Raises ValueError/SyntaxError like
+# literal_eval if it isn't a valid literal. The returned dict is a copy, since
+# the cached one is shared.
+def parse_preset_params(text):
+    result = parse_cached(text)
+    if isinstance(result, dict):
+        return dict(result)
+    return result
+
+# Returns the fmod config named by a run_target line, or BMOD_NAME if it has
+# none. params is the line's parsed preset_params, if it had any.
+def get_fmod(line, params = None):
+    if isinstance(params, dict):
+        fmod = params.get("fmod")
+        if isinstance(fmod, str):
+            return fmod
+        return BMOD_NAME
+
+    # no parsed params; look for the fmod text directly
+    search_term = "'fmod': '"
+    fpos = line.find(search_term)
+    if (fpos == -1):
+        return BMOD_NAME
+    cur_fmod = line[fpos + len(search_term):]
+    delim = cur_fmod.find("'")
+    if (delim == -1):
+        print("WARNING: No closing ' found!")
+        return cur_fmod
+    return cur_fmod[:delim]
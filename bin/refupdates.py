@@ -4,7 +4,7 @@
 import os # for environ and scandir
 import sys # for exit
 import argparse # for argument parsing
-import glob # filename expansion
+from file_walker import find_files # recursive file search
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Recursively searches for \
@@ -37,9 +37,7 @@ if __name__ == "__main__":
     print("Directory to search for source files: " + search_dir)
 
     # locate source files
-    searchspec = os.path.join(search_dir, '**')
-    searchspec = os.path.join(searchspec, source_file)
-    filelist = glob.glob(searchspec, recursive=True)
+    filelist = list(find_files(search_dir, source_file))
 
     # if none found, end
     if len(filelist) == 0:
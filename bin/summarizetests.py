@@ -14,21 +14,54 @@
 #
 # - Use the --num-tests option to set the maximum number of tests to get detailed info for.
 # - Use --platform to specify the name of the platform (this is required to get accurate test command lines for vp tool.)
+# - Use --jobs to parse logs in parallel worker processes (useful for large archives on NFS).
+# - Use --scan-threads to search the archive's top-level subdirectories for logs in parallel threads.
+# - Parsed results are cached in the archive directory (.summarizetests_cache.json), keyed by log path, size and mtime,
+# so re-running after downloading a few more logs only parses the new or changed ones. Use --no-cache to disable.
+# - Use --json and/or --csv to also write per-test records and the aggregate tables for dashboards. The CSV option
+# writes one row per script result, plus the aggregate tables to a second file ending in _aggregates.csv. Records are
+# written as each log is parsed; unless --budget, --ingest or --watch need every result, only the test names, the
+# shortest N results and the counts are kept (plus the summary cache entries; add --no-cache to drop those too).
+# - Use --ingest to add the results to a SQLite history database (tagged with --branch). Run test_history.py on
+# the database for failure rate, flaky script, duration regression and FMOD correlation reports.
+# - Use --budget to pick the set of failing/timed out tests that reproduces the most distinct failing scripts within
+# that many minutes of wall-clock time, split into --parallel command lines to run side by side.
+# - Use --watch to keep running after the summary and report each test log as it completes (and --ingest it, if
+# given). Uses inotify on Linux; use --poll for NFS archives written by other hosts.
 
 import argparse # argument parsing
-import glob # recursive file search
 import os # path functions
-import ast # ast.literal_eval
+import concurrent.futures # ProcessPoolExecutor
+import datetime # watch mode timestamps
+import json # summary cache file and --json output
+import csv # --csv output
+import heapq # shortest N results
+from collections import Counter # aggregate counts
+
+from log_scanner import scan_log # single-pass run_target/summary scanner
+from file_walker import find_files # recursive scandir search
+from log_open import get_log_names # compressed log names
+from file_watcher import watch_files # --watch mode
+from preset_params import parse_preset_params, get_fmod # run_target params
+from test_history import ingest_results # --ingest history database
 
 STYLE_OS = 0
 STYLE_LINUX = 1
 STYLE_WINDOWS = 2
 
+CACHE_FILENAME = ".summarizetests_cache.json"
+# bump this whenever the cached TestResult fields or their parsing change
+CACHE_VERSION = 1
+
 class TestResult:
     RESULT_SUCCESS = 0
     RESULT_FAILURE = 1
     RESULT_TIMEOUT = 2
 
+    # results are pickled back from worker processes; keep them small
+    __slots__ = ("testname", "filename", "totalseconds", "failures", "timeouts",
+                 "successes", "run_targets", "fmod_configs", "param_dicts")
+
     def __init__(self, testname, filename):
         self.testname = testname
         self.filename = filename
@@ -40,6 +73,30 @@ class TestResult:
         self.fmod_configs = []
         self.param_dicts = []
 
+    # fmod_configs and param_dicts aren't stored; they're re-derived from
+    # run_targets on load so the cache doesn't depend on JSON round-tripping
+    # the literal_eval'd parameter values.
+    def to_dict(self):
+        return {
+            "testname" : self.testname,
+            "filename" : self.filename,
+            "totalseconds" : self.totalseconds,
+            "failures" : self.failures,
+            "timeouts" : self.timeouts,
+            "successes" : self.successes,
+            "run_targets" : self.run_targets
+        }
+
+    @staticmethod
+    def from_dict(data):
+        result = TestResult(data["testname"], data["filename"])
+        result.totalseconds = data["totalseconds"]
+        result.failures = data["failures"]
+        result.timeouts = data["timeouts"]
+        result.successes = data["successes"]
+        result.run_targets, result.fmod_configs, result.param_dicts = get_params_and_fmods(data["run_targets"])
+        return result
+
 def parse_args():
     parser = argparse.ArgumentParser(description="Summarizes results of downloaded pretest logs.")
     parser.add_argument('dir', type=str, help='Directory containing extracted pretest logs.')
@@ -47,48 +104,23 @@ def parse_args():
     parser.add_argument('-p', '--platform', type=str, default="novalake-s-6.0", help='Platform string to use in test commands. Default is novalake-s-6.0')
     parser.add_argument('-w', '--windows', action='store_true', help='Force test command to Windows format.')
     parser.add_argument('-l', '--linux', action='store_true', help='Force test command to Linux format.')
-    parser.add_argument
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='Number of worker processes used to parse logs. Default is the CPU count; use 1 to parse in-process.')
+    parser.add_argument('--scan-threads', type=int, default=0, help='Number of threads used to search the archive directory for logs, one top-level subdirectory at a time. Helps on NFS. Default is 0 (single-threaded).')
+    parser.add_argument('--json', type=str, default=None, help='Also write per-test records and aggregate tables to this JSON file.')
+    parser.add_argument('--csv', type=str, default=None, help='Also write per-script result rows to this CSV file (aggregate tables go to <name>_aggregates.csv).')
+    parser.add_argument('--budget', type=float, default=None, help='Wall-clock minutes available for local triage. Selects the failing and timed out tests that cover the most distinct failing scripts within this time.')
+    parser.add_argument('--parallel', type=int, default=1, help='Number of test commands to run side by side within --budget. Default is 1.')
+    parser.add_argument('--ingest', type=str, default=None, help='Add the parsed results to this SQLite history database (see test_history.py).')
+    parser.add_argument('-b', '--branch', type=str, default="unknown", help='Branch name recorded with --ingest results. Default is "unknown".')
+    parser.add_argument('--watch', action='store_true', help='After summarizing, keep watching dir and report new or updated test logs as they complete.')
+    parser.add_argument('--poll', action='store_true', help='In --watch mode, poll the directory instead of using inotify (needed on NFS when tests run on other hosts).')
+    parser.add_argument('--poll-interval', type=float, default=30.0, help='Seconds between directory scans when polling. Default is 30.')
+    parser.add_argument('--settle', type=float, default=10.0, help='In --watch mode, seconds a log must go unchanged before it is parsed. Default is 10.')
+    parser.add_argument('--no-cache', action='store_true', help=f'Don\'t read or write the {CACHE_FILENAME} summary cache in the archive directory.')
     args = parser.parse_args()
     return args
 
-def tail(filename, lines=10):
-    # adapted from: https://stackoverflow.com/questions/136168/get-last-n-lines-of-a-file-similar-to-tail
-
-    if lines == 0:
-        print("ERROR: Must specify at least 1 line to return.")
-        return []
-    
-    f = open(filename, "rb")
-
-    BUFSIZ = 1024
-    f.seek(0, 2)
-    remaining_bytes = f.tell()
-    size = lines + 1
-    block = -1
-    data = []
-
-    while size > 0 and remaining_bytes > 0:
-        if remaining_bytes - BUFSIZ > 0:
-            # Seek back one whole BUFSIZ
-            f.seek(block * BUFSIZ, 2)
-            # read BUFFER
-            bunch = f.read(BUFSIZ)
-        else:
-            # file too small, start from beginning
-            f.seek(0, 0)
-            # only read what was not read
-            bunch = f.read(remaining_bytes)
-
-        bunch = bunch.decode('utf-8')
-        data.insert(0, bunch)
-        size -= bunch.count('\n')
-        remaining_bytes -= BUFSIZ
-        block -= 1
-
-    f.close()
-    return ''.join(data).splitlines()[-lines:]
-
-def find_test_logs(dir, filename = "test.log"):
+def find_test_logs(dir, filename = "test.log", threads = 0):
     foundfiles = []
     # confirm directory exists
     if (not os.path.exists(dir)) or (not os.path.isdir(dir)):
@@ -96,9 +128,7 @@ def find_test_logs(dir, filename = "test.log"):
         return foundfiles
     
     # do recursive search for files matching filename
-    searchspec = os.path.join(dir, '**')
-    searchspec = os.path.join(searchspec, filename)
-    foundfiles = glob.glob(searchspec, recursive=True)
+    foundfiles = list(find_files(dir, get_log_names(filename), threads=threads))
 
     # return list of filenames
     return foundfiles
@@ -195,37 +225,337 @@ def extract_results(filename, tail_lines):
     result.totalseconds = cur_total_time
     return result
 
-def collect_logs(filelist):
-    results = []
-
-    # collect test results (at end of file)
-    for curfile in filelist:
+# Parses a single test.log into a TestResult. Runs in worker processes, so it
+# never raises: returns (result, error) where error is None on success. A
+# result of None with no error means the file isn't a usable test log.
+def parse_log(curfile):
+    try:
         # print(f"FILE: {curfile}")
-        curlines = tail(curfile)
-        curresult = extract_results(curfile, curlines)
+        # one pass over the file gets both the run_target lines and the summary block
+        target_lines, summary_lines = scan_log(curfile)
+        curresult = extract_results(curfile, summary_lines)
         if (curresult is not None):
             # collect test parameters (at beginning and sometimes middle of file) "[sim info] run_target("
             # store the run_target line in self.run_targets
             # parse the fmod configuration out of the run_target line
             # store the run_target line in a simple list (fmod_configs). will do a separate method that counts each fmod configuration's usage. dupes allowed in this list.
-            curresult.run_targets, curresult.fmod_configs, curresult.param_dicts = get_params_and_fmods(curfile)
-            results.append(curresult)
-
-    total_success = 0
-    total_fail = 0
-    total_timeout = 0
+            curresult.run_targets, curresult.fmod_configs, curresult.param_dicts = get_params_and_fmods(target_lines)
+    except Exception as e:
+        return None, repr(e)
+    return curresult, None
+
+def get_cache_path(dir):
+    return os.path.join(dir, CACHE_FILENAME)
+
+# Returns the cached entries (relative log path -> entry), or an empty dict if
+# there's no usable cache. A stale or corrupt cache is never fatal.
+def load_cache(cache_path):
+    if (not os.path.isfile(cache_path)):
+        return {}
+    try:
+        with open(cache_path, "r") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"WARNING: Ignoring unreadable cache {cache_path}: {e}")
+        return {}
+    if (data.get("version") != CACHE_VERSION):
+        print(f"INFO: Cache {cache_path} is from a different version; rebuilding.")
+        return {}
+    return data.get("entries", {})
+
+def save_cache(cache_path, entries):
+    # write to a temp file and rename so an interrupted run can't leave a truncated cache
+    temp_path = cache_path + ".tmp"
+    try:
+        with open(temp_path, "w") as f:
+            json.dump({"version" : CACHE_VERSION, "entries" : entries}, f)
+        os.replace(temp_path, cache_path)
+    except OSError as e:
+        print(f"WARNING: Unable to write cache {cache_path}: {e}")
+
+def get_file_stamp(curfile):
+    stat = os.stat(curfile)
+    return stat.st_size, stat.st_mtime_ns
+
+def parse_logs(filelist, jobs = 1):
+    # collect test results (at end of file)
+    if (jobs is None) or (jobs <= 1) or (len(filelist) <= 1):
+        yield from map(parse_log, filelist)
+        return
+
+    # map() keeps results in filelist order, so output doesn't depend on which worker finishes first
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        chunksize = max(1, len(filelist) // (jobs * 8))
+        yield from executor.map(parse_log, filelist, chunksize=chunksize)
+
+# Yields the TestResult of each log in filelist order, as soon as it's parsed
+# (or found in the cache), and prints the totals once all logs are done.
+# cache_dir is the archive directory holding the summary cache, or None to
+# parse every log.
+def iter_logs(filelist, jobs = 1, cache_dir = None):
+    errors = 0
+    totals = Counter()
+
+    cache_path = None
+    cached = {}
+    new_entries = {}
+    if (cache_dir is not None):
+        cache_path = get_cache_path(cache_dir)
+        cached = load_cache(cache_path)
+
+    # reuse cached results for logs whose size and mtime haven't changed
+    to_parse = []
+    stamps = {}
+    cached_entries = {}
+    for index, curfile in enumerate(filelist):
+        if (cache_path is None):
+            to_parse.append(index)
+            continue
+        key = os.path.relpath(curfile, cache_dir)
+        try:
+            stamps[index] = get_file_stamp(curfile)
+        except OSError:
+            to_parse.append(index)
+            continue
+        entry = cached.get(key)
+        if (entry is not None) and (entry["size"] == stamps[index][0]) and (entry["mtime_ns"] == stamps[index][1]):
+            cached_entries[index] = entry
+            new_entries[key] = entry
+        else:
+            to_parse.append(index)
+
+    if (cache_path is not None):
+        print(f"Cached logs reused: {len(filelist) - len(to_parse)}, logs to parse: {len(to_parse)}")
+
+    # parse_logs yields in to_parse order, which is ascending, so cached and
+    # parsed results can be merged back into filelist order as they arrive
+    parsed = parse_logs([filelist[index] for index in to_parse], jobs)
+    for index, curfile in enumerate(filelist):
+        entry = cached_entries.pop(index, None)
+        if (entry is not None):
+            curresult = TestResult.from_dict(entry["result"])
+        else:
+            curresult, error = next(parsed)
+            if (error is not None):
+                print(f"ERROR: Unable to parse {curfile}: {error}")
+                errors += 1
+                continue
+            if (curresult is None):
+                continue
+            # logs that failed to parse or aren't test logs aren't cached, so their messages repeat on the next run
+            if (index in stamps):
+                new_entries[os.path.relpath(curfile, cache_dir)] = {
+                    "size" : stamps[index][0],
+                    "mtime_ns" : stamps[index][1],
+                    "result" : curresult.to_dict()
+                }
+        totals.update(get_result_totals(curresult))
+        yield curresult
+
+    # entries for logs that no longer exist are dropped
+    if (cache_path is not None) and ((len(to_parse) > 0) or (len(new_entries) != len(cached))):
+        save_cache(cache_path, new_entries)
+
+    print(f"Total successes: {totals['successes']}")
+    print(f"Total failures: {totals['failures']}")
+    print(f"Total timeouts: {totals['timeouts']}")
+    if (errors > 0):
+        print(f"Logs that could not be parsed: {errors}")
+    print("")
 
+def get_result_totals(result):
+    return {
+        "successes" : len(result.successes),
+        "failures" : len(result.failures),
+        "timeouts" : len(result.timeouts)
+    }
+
+RESULT_TYPE_NAMES = {
+    TestResult.RESULT_SUCCESS : "SUCCESS",
+    TestResult.RESULT_FAILURE : "FAILURE",
+    TestResult.RESULT_TIMEOUT : "TIMEOUT"
+}
+
+# Aggregate tables printed at the end of the summary (and written to --json/--csv)
+class SummaryCounts:
+    def __init__(self):
+        self.totals = Counter()
+        self.fmod_configs = Counter()
+        self.timeout_scripts = Counter()
+        self.failed_scripts = Counter()
+        self.params = Counter()
+
+    def add(self, result):
+        self.totals.update(get_result_totals(result))
+        # find all recorded fmod configs
+        self.fmod_configs.update(result.fmod_configs)
+        # find all failed and timed out scripts
+        self.failed_scripts.update(cur_fail["SCRIPT"] for cur_fail in result.failures)
+        self.timeout_scripts.update(cur_time["SCRIPT"] for cur_time in result.timeouts)
+        for cur_param in result.param_dicts:
+            self.params.update(f"{key}:{value}" for key, value in cur_param.items())
+
+    def get_tables(self):
+        return {
+            "totals" : self.totals,
+            "fmod_configs" : self.fmod_configs,
+            "timeout_scripts" : self.timeout_scripts,
+            "failed_scripts" : self.failed_scripts,
+            "params" : dict(sorted(self.params.items()))
+        }
+
+def get_test_record(result):
+    record = result.to_dict()
+    record["fmod_configs"] = result.fmod_configs
+    record["param_dicts"] = result.param_dicts
+    return record
+
+# Writes {"tests": [...], <aggregate tables>} one test record at a time, as
+# each log is parsed, so the whole document is never built in memory.
+class JsonSummaryWriter:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "w")
+        self.count = 0
+        self.file.write('{\n"tests": [\n')
+
+    def write_result(self, result):
+        if (self.count > 0):
+            self.file.write(",\n")
+        # param values come from literal_eval and may not all be JSON types
+        json.dump(get_test_record(result), self.file, default=repr)
+        self.count += 1
+
+    def close(self, counts):
+        self.file.write("\n]")
+        for key, table in counts.get_tables().items():
+            self.file.write(f',\n"{key}": ')
+            json.dump(table, self.file)
+        self.file.write("\n}\n")
+        self.file.close()
+        print(f"Wrote {self.count} test records to {self.path}")
+
+# Writes one row per script result, and the aggregate tables as
+# table,key,count rows to a second file.
+class CsvSummaryWriter:
+    COLUMNS = ["test", "file", "script", "result", "seconds", "test_seconds", "fmod_configs"]
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "w", newline="")
+        self.writer = csv.writer(self.file, quoting=csv.QUOTE_ALL)
+        self.writer.writerow(self.COLUMNS)
+        self.count = 0
+
+    def get_aggregates_path(self):
+        root, ext = os.path.splitext(self.path)
+        return root + "_aggregates" + (ext if ext else ".csv")
+
+    def write_result(self, result):
+        fmods = ";".join(result.fmod_configs)
+        for cur_list in (result.successes, result.failures, result.timeouts):
+            for cur_script in cur_list:
+                self.writer.writerow([result.testname, result.filename, cur_script["SCRIPT"],
+                                      RESULT_TYPE_NAMES[cur_script["TYPE"]], cur_script["SECONDS"],
+                                      result.totalseconds, fmods])
+                self.count += 1
+
+    def close(self, counts):
+        self.file.close()
+        aggregates_path = self.get_aggregates_path()
+        with open(aggregates_path, "w", newline="") as f:
+            writer = csv.writer(f, quoting=csv.QUOTE_ALL)
+            writer.writerow(["table", "key", "count"])
+            for table_name, table in counts.get_tables().items():
+                for key, value in table.items():
+                    writer.writerow([table_name, key, value])
+        print(f"Wrote {self.count} script results to {self.path} and aggregate tables to {aggregates_path}")
+
+def print_log_update(result):
+    totals = get_result_totals(result)
+    timestamp = datetime.datetime.now().strftime("%H:%M:%S")
+    print(f"[{timestamp}] {result.testname} - {totals['successes']} successes, {totals['failures']} failures, {totals['timeouts']} timeouts ({result.totalseconds:.1f} seconds)")
+    for cur_fail in result.failures:
+        print(f"- FAILURE: {cur_fail['SCRIPT']} ({cur_fail['SECONDS']} seconds)")
+    for cur_time in result.timeouts:
+        print(f"- TIMEOUT: {cur_time['SCRIPT']} ({cur_time['SECONDS']} seconds)")
+
+# Reports each test log as it's written (and settles), keeping running totals
+# that start from the already summarized results.
+def watch_archive(args, results):
+    by_file = {}
+    totals = Counter()
     for cur_result in results:
-        total_success += len(cur_result.successes)
-        total_fail += len(cur_result.failures)
-        total_timeout += len(cur_result.timeouts)
-    
-    print(f"Total successes: {total_success}")
-    print(f"Total failures: {total_fail}")
-    print(f"Total timeouts: {total_timeout}")
-    print("")
+        by_file[cur_result.filename] = cur_result
+        totals.update(get_result_totals(cur_result))
+
+    print(f"Watching {args.dir} for new or updated test logs (Ctrl-C to stop)...")
+    try:
+        for batch in watch_files(args.dir, get_log_names("test.log"), args.settle, args.poll_interval, args.poll):
+            updated = []
+            for curfile in batch:
+                curresult, error = parse_log(curfile)
+                if (error is not None):
+                    print(f"ERROR: Unable to parse {curfile}: {error}")
+                    continue
+                if (curresult is None):
+                    continue
+                if (sum(get_result_totals(curresult).values()) == 0):
+                    # no summary yet, so the test is still running; it'll be seen again when it's updated
+                    continue
+                old_result = by_file.get(curfile)
+                if (old_result is not None):
+                    totals.subtract(get_result_totals(old_result))
+                totals.update(get_result_totals(curresult))
+                by_file[curfile] = curresult
+                print_log_update(curresult)
+                updated.append(curresult)
+
+            if (len(updated) == 0):
+                continue
+            if (args.ingest is not None):
+                added, skipped = ingest_results(args.ingest, updated, args.branch, RESULT_TYPE_NAMES)
+                print(f"Ingested {added} test logs into {args.ingest}.")
+            print(f"Totals: {totals['successes']} successes, {totals['failures']} failures, {totals['timeouts']} timeouts in {len(by_file)} tests")
+            print("")
+    except KeyboardInterrupt:
+        print("")
+        print("Stopped watching.")
+
+def has_result_type(result, type):
+    if (type == TestResult.RESULT_FAILURE):
+        return len(result.failures) > 0
+    elif (type == TestResult.RESULT_TIMEOUT):
+        return len(result.timeouts) > 0
+    return len(result.successes) > 0
+
+# Keeps the max_num shortest (or longest) results of one type as results are
+# added, so get_top_results doesn't need every result. get_results returns
+# them in the order get_top_results would sort the full list.
+class TopResults:
+    def __init__(self, type, max_num, highest = False):
+        self.type = type
+        # get_top_results always prints at least one
+        self.max_num = max(max_num, 1)
+        self.highest = highest
+        self.count = 0
+        # heap of (-sort key, -arrival, result): the root is the first one to drop
+        self.heap = []
+
+    def add(self, result):
+        if (not has_result_type(result, self.type)):
+            return
+        key = -result.totalseconds if (self.highest) else result.totalseconds
+        # arrival order breaks ties, as the stable sort does
+        item = (-key, -self.count, result)
+        self.count += 1
+        if (len(self.heap) < self.max_num):
+            heapq.heappush(self.heap, item)
+        else:
+            heapq.heappushpop(self.heap, item)
 
-    return results
+    def get_results(self):
+        return [item[2] for item in sorted(self.heap, key = lambda item: (item[0], item[1]), reverse=True)]
 
 def get_top_results(results, type, max_num, platform, style, highest = False):
     testnames = []
@@ -240,16 +570,7 @@ def get_top_results(results, type, max_num, platform, style, highest = False):
         type_text = "timeouts"
 
     # get subset of tests depending on whether there are any of the requested type
-    subresults = []
-    for cur_result in results:
-        if (type == TestResult.RESULT_FAILURE):
-            if (len(cur_result.failures) > 0):
-                subresults.append(cur_result)
-        elif (type == TestResult.RESULT_TIMEOUT):
-            if (len(cur_result.timeouts) > 0):
-                subresults.append(cur_result)
-        elif (len(cur_result.successes) > 0):
-            subresults.append(cur_result)
+    subresults = [cur_result for cur_result in results if has_result_type(cur_result, type)]
 
     # sort the list in ascending or descending order (highest = descending)
     print (f"{status_text} {max_num} {type_text}:")
@@ -274,14 +595,10 @@ def get_top_results(results, type, max_num, platform, style, highest = False):
                 print(f"--- {cur_fmod}")
 
         # format command
-        formatted_test = cur_result.testname
-        if (style == STYLE_LINUX):
-            formatted_test = formatted_test.replace(os.path.sep, "/")
-        elif (style == STYLE_WINDOWS):
-            formatted_test = formatted_test.replace(os.path.sep, "\\")
+        formatted_test = format_test_name(cur_result.testname, style)
         testnames.append(formatted_test)
 
-        print(f"- Cmd: vp platform test {platform} --keep-logs --by-name {formatted_test}")
+        print(f"- Cmd: {build_test_command(platform, [formatted_test])}")
 
         cur_idx += 1
         if (cur_idx >= max_num):
@@ -290,68 +607,134 @@ def get_top_results(results, type, max_num, platform, style, highest = False):
         print("")
     
     # build a command to run all X tests
-    big_command = f"vp platform test {platform} --keep-logs --by-name "
-    for cur_name in testnames:
-        big_command += cur_name
-        big_command += " "
+    big_command = build_test_command(platform, testnames)
     print("")
     print(f"Command to run all {len(testnames)} tests:")
     print(big_command)
 
     print("")
 
+def format_test_name(testname, style):
+    if (style == STYLE_LINUX):
+        return testname.replace(os.path.sep, "/")
+    elif (style == STYLE_WINDOWS):
+        return testname.replace(os.path.sep, "\\")
+    return testname
 
-def get_matching_lines(filename, starting_string):
-    lines = []
-    with open(filename, 'r') as file:
-        curline = file.readline()
-        while curline:
-            # bytes_str = starting_string.encode('utf-8')
-            if (curline.find(starting_string) != -1):
-                lines.append(curline.strip())
-            curline = file.readline()
-        file.close()
-    
-    return lines
+def build_test_command(platform, testnames):
+    return f"vp platform test {platform} --keep-logs --by-name " + " ".join(testnames)
+
+def get_failing_scripts(result):
+    return set(cur["SCRIPT"] for cur in result.failures) | set(cur["SCRIPT"] for cur in result.timeouts)
 
-def get_params_and_fmods(filename):
+# Chooses failing/timed out tests to rerun locally. Each test costs its total
+# logged run time and "covers" the scripts that failed or timed out in it. The
+# tests are packed into `parallel` groups that must each finish within
+# budget_seconds, maximizing the number of distinct failing scripts covered
+# (weighted set cover under a knapsack constraint).
+#
+# Solved greedily: repeatedly take the test with the most newly covered scripts
+# per second that still fits in the least loaded group. As with the usual
+# greedy knapsack, the single test covering the most scripts is also
+# considered on its own, and the better of the two selections is returned.
+# Returns a list of groups, each a list of TestResults.
+def select_failure_batch(results, budget_seconds, parallel):
+    parallel = max(1, parallel)
+    candidates = []
+    for cur_result in results:
+        scripts = get_failing_scripts(cur_result)
+        # tests with no time logged still take time to run; don't let them look free
+        cost = max(cur_result.totalseconds, 1.0)
+        if (len(scripts) > 0) and (cost <= budget_seconds):
+            candidates.append((cur_result, scripts, cost))
+
+    groups = [[] for _ in range(parallel)]
+    loads = [0.0] * parallel
+    covered = set()
+    remaining = list(candidates)
+    while (len(remaining) > 0):
+        best = None
+        best_ratio = 0.0
+        min_load = min(loads)
+        for cur_idx, (cur_result, scripts, cost) in enumerate(remaining):
+            if (min_load + cost > budget_seconds):
+                continue
+            new_count = len(scripts - covered)
+            if (new_count == 0):
+                continue
+            ratio = new_count / cost
+            if (ratio > best_ratio):
+                best = cur_idx
+                best_ratio = ratio
+        if (best is None):
+            break
+        cur_result, scripts, cost = remaining.pop(best)
+        group_idx = loads.index(min_load)
+        groups[group_idx].append(cur_result)
+        loads[group_idx] += cost
+        covered |= scripts
+
+    # compare against the single best test
+    if (len(candidates) > 0):
+        single = max(candidates, key = lambda x: (len(x[1]), -x[2]))
+        if (len(single[1]) > len(covered)):
+            groups = [[single[0]]] + [[] for _ in range(parallel - 1)]
+
+    return [cur_group for cur_group in groups if len(cur_group) > 0]
+
+def print_failure_batch(results, budget_minutes, parallel, platform, style):
+    budget_seconds = budget_minutes * 60.0
+    groups = select_failure_batch(results, budget_seconds, parallel)
+
+    all_scripts = set()
+    for cur_result in results:
+        all_scripts |= get_failing_scripts(cur_result)
+
+    covered = set()
+    for cur_group in groups:
+        for cur_result in cur_group:
+            covered |= get_failing_scripts(cur_result)
+
+    print(f"Failure batch for a {budget_minutes:g} minute budget across {parallel} parallel command(s):")
+    if (len(groups) == 0):
+        print("- No failing or timed out test fits in the budget.")
+        print("")
+        return
+    print(f"- Covers {len(covered)} of {len(all_scripts)} distinct failing or timed out scripts.")
+    for group_idx, cur_group in enumerate(groups):
+        group_seconds = sum(cur_result.totalseconds for cur_result in cur_group)
+        print("")
+        print(f"Command {group_idx + 1} ({len(cur_group)} tests, {group_seconds:.0f} seconds):")
+        for cur_result in cur_group:
+            scripts = ", ".join(sorted(get_failing_scripts(cur_result)))
+            print(f"- {cur_result.testname} - {cur_result.totalseconds:.1f} seconds - {scripts}")
+        testnames = [format_test_name(cur_result.testname, style) for cur_result in cur_group]
+        print(build_test_command(platform, testnames))
+    print("")
+
+
+# takes the "[sim info] run_target(" lines found by scan_log
+def get_params_and_fmods(lines):
     fmods = []
-    lines = get_matching_lines(filename, "[sim info] run_target(")
     param_dicts = []
 
     if len(lines) == 0:
-        # print(f"WARNING: No target line found in {filename}. Returning.")
-        return lines, fmods
+        # print(f"WARNING: No target line found. Returning.")
+        return lines, fmods, param_dicts
     
     for cur_line in lines:
-        # get just fmods
-        search_term = "'fmod': '"
-        fpos = cur_line.find(search_term)
-        if (fpos == -1):
-            fmods.append("(BMOD)")
-        else:
-            cur_fmod = cur_line[fpos + len(search_term):]
-            delim = cur_fmod.find("'")
-            if (delim == -1):
-                print("WARNING: No closing ' found!")
-            else:
-                cur_fmod = cur_fmod[:delim]
-            fmods.append(cur_fmod)
         # get all parameters
+        param_dict = None
         search_term = "preset_params "
         fpos = cur_line.find(search_term)
         if (fpos == -1):
             print(f"WARNING: No params found in line {cur_line}")
         else:
-            param_line = cur_line[fpos + len(search_term):]
-            # yaml is not a default python package
-            #param_dict = yaml.load(param_line)
-            param_line.replace("'", "\"")
-            # print(f"param_line: {param_line}")
-            # print(f"cur_line: {cur_line}")
-            param_dict = ast.literal_eval(param_line)
+            param_dict = parse_preset_params(cur_line[fpos + len(search_term):])
             param_dicts.append(param_dict)
-            
+        # get just fmods
+        fmods.append(get_fmod(cur_line, param_dict))
+
     return lines, fmods, param_dicts
 
 
@@ -375,17 +758,45 @@ if __name__ == "__main__":
     else:
         print(f"Test command style: Windows")
 
-    found_logs = find_test_logs(args.dir, "test.log")
+    found_logs = find_test_logs(args.dir, "test.log", args.scan_threads)
     if (len(found_logs) == 0):
         print(f"ERROR: No test logs found in {args.dir}.")
-        quit()
+        if (not args.watch):
+            quit()
 
     # get details for all tests
-    results = collect_logs(found_logs)
+    cache_dir = None
+    if (not args.no_cache):
+        cache_dir = args.dir
+
+    # The text report only needs the test names, the shortest timeouts and
+    # failures, and the counts, so results are reported and written as they're
+    # parsed. The full list is only kept for the options that need every result.
+    results = None
+    if (args.budget is not None) or (args.ingest is not None) or (args.watch):
+        results = []
+
+    writers = []
+    if (args.json is not None):
+        writers.append(JsonSummaryWriter(args.json))
+    if (args.csv is not None):
+        writers.append(CsvSummaryWriter(args.csv))
 
     testnames = []
-    for cur_result in results:
+    top_timeouts = TopResults(TestResult.RESULT_TIMEOUT, args.num_tests)
+    top_failures = TopResults(TestResult.RESULT_FAILURE, args.num_tests)
+    # find all fmod combinations used and count them
+    counts = SummaryCounts()
+    for cur_result in iter_logs(found_logs, args.jobs, cache_dir):
         testnames.append(cur_result.testname)
+        top_timeouts.add(cur_result)
+        top_failures.add(cur_result)
+        counts.add(cur_result)
+        for cur_writer in writers:
+            cur_writer.write_result(cur_result)
+        if (results is not None):
+            results.append(cur_result)
+
     # sort the list of test names and print it
     testnames = sorted(testnames)
     print("Complete list of tests with failures or timeouts:")
@@ -394,46 +805,19 @@ if __name__ == "__main__":
     print("")
 
     # return the shortest timeout results
-    get_top_results(results, TestResult.RESULT_TIMEOUT, args.num_tests, args.platform, style)
+    get_top_results(top_timeouts.get_results(), TestResult.RESULT_TIMEOUT, args.num_tests, args.platform, style)
 
     # return the shortest failure results
-    get_top_results(results, TestResult.RESULT_FAILURE, args.num_tests, args.platform, style)
+    get_top_results(top_failures.get_results(), TestResult.RESULT_FAILURE, args.num_tests, args.platform, style)
 
-    # find all fmod combinations used and count them
-    cfg_dict = {}
-    time_dict = {}
-    fail_dict = {}
-    params_dict = {}
-    for cur_res in results:
-        # find all recorded fmod configs
-        for cur_cfg in cur_res.fmod_configs:
-            if cur_cfg in cfg_dict:
-                cfg_dict[cur_cfg] = cfg_dict[cur_cfg] + 1
-            else:
-                cfg_dict[cur_cfg] = 1
+    # pick the failing tests that reproduce the most failures within the time budget
+    if (args.budget is not None):
+        print_failure_batch(results, args.budget, args.parallel, args.platform, style)
 
-        # find all failed scripts
-        for cur_fail in cur_res.failures:
-            if cur_fail["SCRIPT"] in fail_dict:
-                fail_dict[cur_fail["SCRIPT"]] = fail_dict[cur_fail["SCRIPT"]] + 1
-            else:
-                fail_dict[cur_fail["SCRIPT"]] = 1
-
-        # find all timed out scripts
-        for cur_time in cur_res.timeouts:
-            if cur_time["SCRIPT"] in time_dict:
-                time_dict[cur_time["SCRIPT"]] = time_dict[cur_time["SCRIPT"]] + 1
-            else:
-                time_dict[cur_time["SCRIPT"]] = 1
-        
-        for cur_param in cur_res.param_dicts:
-            #for pindex, (key, value) in enumerate(cur_param.items()):
-            for key, value in cur_param.items():
-                new_key = f"{key}:{value}"
-                if new_key in params_dict:
-                    params_dict[new_key] = params_dict[new_key] + 1
-                else:
-                    params_dict[new_key] = 1
+    cfg_dict = counts.fmod_configs
+    time_dict = counts.timeout_scripts
+    fail_dict = counts.failed_scripts
+    params_dict = counts.params
 
     if (len(cfg_dict) == 0):
         print("No fmod configurations found.")
@@ -465,3 +849,17 @@ if __name__ == "__main__":
         print("Test parameters used:")
         for key, value in sorted(params_dict.items()):
             print(f"- {key} : {value} times")
+
+    if (len(writers) > 0):
+        print("")
+    for cur_writer in writers:
+        cur_writer.close(counts)
+
+    if (args.ingest is not None):
+        print("")
+        added, skipped = ingest_results(args.ingest, results, args.branch, RESULT_TYPE_NAMES)
+        print(f"Ingested {added} test logs into {args.ingest} (branch {args.branch}), skipped {skipped} already recorded.")
+
+    if (args.watch):
+        print("")
+        watch_archive(args, results)
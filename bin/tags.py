@@ -3,11 +3,11 @@
 try:
     import os # path functions
     import sys # argument processing
-    import glob # filename expansion
     import datetime # date and time functions
     from shutil import copyfile # copy files when needed
     import re # regular expressions
     import subprocess # running external processes
+    from file_walker import find_files # recursive file search
 
 except:
     print("ERROR: Problem importing dependencies. Are you running from the root of a project directory? (tgl, adl, etc.)")
@@ -15,9 +15,8 @@ except:
 
 def get_suiteinfos(dirname):
     #print os.path.join(dirname, "*.py")
-    searchspec = os.path.join(dirname, '**')
-    searchspec = os.path.join(searchspec, 'SUITEINFO')
-    filelist = glob.glob(searchspec, recursive=True)
+    # build output never contains SUITEINFO files, so don't descend into it
+    filelist = list(find_files(dirname, 'SUITEINFO', prune=['linux64/obj', 'win64/obj']))
     if len(filelist) == 0:
         print ("ERROR: No files found matching", os.path.join(dirname, "SUITEINFO"))
     return sorted(filelist)
@@ -0,0 +1,207 @@
+#!/usr/intel/bin/python3.12.3
+
+# Keeps a local SQLite history of pretest results, so results can be compared across runs instead of
+# re-parsing old archives. summarizetests.py --ingest adds results to the database; this script runs
+# report queries against it:
+# - Per-script failure rates (failures and timeouts out of all runs).
+# - Flaky scripts: scripts that both passed and failed on the same branch.
+# - Duration regressions: scripts whose recent successful runs are much slower than earlier ones.
+# - FMOD correlation: scripts that fail noticeably more often under one FMOD config than overall.
+#
+# - Use --branch to limit the reports to one branch.
+# - Use --min-runs to ignore scripts with too few runs to be meaningful.
+
+import argparse # argument parsing
+import datetime # fromtimestamp
+import json # params column
+import os # path functions
+import sqlite3 # history database
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS logs (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    test TEXT NOT NULL,
+    branch TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    fmod TEXT NOT NULL,
+    params TEXT NOT NULL,
+    UNIQUE (path, size, mtime_ns)
+);
+CREATE TABLE IF NOT EXISTS results (
+    log_id INTEGER NOT NULL REFERENCES logs(id),
+    script TEXT NOT NULL,
+    result TEXT NOT NULL,
+    seconds REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS logs_branch ON logs (branch);
+CREATE INDEX IF NOT EXISTS logs_timestamp ON logs (timestamp);
+CREATE INDEX IF NOT EXISTS logs_fmod ON logs (fmod);
+CREATE INDEX IF NOT EXISTS results_script ON results (script, result);
+CREATE INDEX IF NOT EXISTS results_log ON results (log_id);
+"""
+
+RESULT_SUCCESS = "SUCCESS"
+RESULT_FAILURE = "FAILURE"
+RESULT_TIMEOUT = "TIMEOUT"
+
+# every result row joined with the run it came from, optionally limited to one branch
+RUNS_QUERY = """
+SELECT r.script AS script, r.result AS result, r.seconds AS seconds,
+       l.branch AS branch, l.fmod AS fmod, l.timestamp AS timestamp
+FROM results r JOIN logs l ON r.log_id = l.id
+WHERE (:branch IS NULL OR l.branch = :branch)
+"""
+
+def open_history(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.executescript(SCHEMA)
+    return conn
+
+# Adds TestResults (from summarizetests.py) to the database. Logs that were
+# already ingested (same path, size and mtime) are skipped. result_names maps
+# the TestResult RESULT_* values to the strings stored in the database.
+# Returns (logs added, logs skipped).
+def ingest_results(db_path, results, branch, result_names):
+    added = 0
+    skipped = 0
+    conn = open_history(db_path)
+    with conn:
+        for cur_result in results:
+            path = os.path.abspath(cur_result.filename)
+            try:
+                stat = os.stat(path)
+            except OSError as e:
+                print(f"WARNING: Unable to stat {path}, not ingesting it: {e.strerror}")
+                skipped += 1
+                continue
+            timestamp = datetime.datetime.fromtimestamp(stat.st_mtime).isoformat(timespec="seconds")
+            fmod = ";".join(sorted(set(cur_result.fmod_configs)))
+            # param values come from literal_eval and may not all be JSON types
+            params = json.dumps(cur_result.param_dicts, default=repr, sort_keys=True)
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO logs (path, size, mtime_ns, test, branch, timestamp, fmod, params) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (path, stat.st_size, stat.st_mtime_ns, cur_result.testname, branch, timestamp, fmod, params))
+            if (cursor.rowcount == 0):
+                skipped += 1
+                continue
+            log_id = cursor.lastrowid
+            rows = []
+            for cur_list in (cur_result.successes, cur_result.failures, cur_result.timeouts):
+                for cur_script in cur_list:
+                    rows.append((log_id, cur_script["SCRIPT"], result_names[cur_script["TYPE"]], cur_script["SECONDS"]))
+            conn.executemany("INSERT INTO results (log_id, script, result, seconds) VALUES (?, ?, ?, ?)", rows)
+            added += 1
+    conn.close()
+    return added, skipped
+
+def get_failure_rates(conn, branch, min_runs):
+    return conn.execute(f"""
+        SELECT script, COUNT(*) AS runs,
+               SUM(result = '{RESULT_FAILURE}') AS failures,
+               SUM(result = '{RESULT_TIMEOUT}') AS timeouts,
+               1.0 * SUM(result != '{RESULT_SUCCESS}') / COUNT(*) AS rate
+        FROM ({RUNS_QUERY})
+        GROUP BY script
+        HAVING runs >= :min_runs AND rate > 0
+        ORDER BY rate DESC, runs DESC, script
+        """, {"branch" : branch, "min_runs" : min_runs}).fetchall()
+
+def get_flaky_scripts(conn, branch, min_runs):
+    return conn.execute(f"""
+        SELECT branch, script, COUNT(*) AS runs,
+               SUM(result = '{RESULT_SUCCESS}') AS passes,
+               SUM(result != '{RESULT_SUCCESS}') AS fails
+        FROM ({RUNS_QUERY})
+        GROUP BY branch, script
+        HAVING runs >= :min_runs AND passes > 0 AND fails > 0
+        ORDER BY MIN(passes, fails) DESC, runs DESC, branch, script
+        """, {"branch" : branch, "min_runs" : min_runs}).fetchall()
+
+# Compares the average duration of each script's latest `window` successful
+# runs with the average of all its earlier successful runs.
+def get_duration_regressions(conn, branch, min_runs, window, threshold):
+    return conn.execute(f"""
+        WITH ranked AS (
+            SELECT script, seconds,
+                   ROW_NUMBER() OVER (PARTITION BY script ORDER BY timestamp DESC) AS age
+            FROM ({RUNS_QUERY})
+            WHERE result = '{RESULT_SUCCESS}'
+        )
+        SELECT script,
+               AVG(CASE WHEN age <= :window THEN seconds END) AS recent,
+               AVG(CASE WHEN age > :window THEN seconds END) AS earlier,
+               COUNT(*) AS runs
+        FROM ranked
+        GROUP BY script
+        HAVING runs >= :min_runs AND earlier > 0 AND recent >= earlier * :threshold
+        ORDER BY recent / earlier DESC, script
+        """, {"branch" : branch, "min_runs" : min_runs, "window" : window, "threshold" : threshold}).fetchall()
+
+# Failure rate of each script under each FMOD config, compared with the
+# script's overall failure rate.
+def get_fmod_correlations(conn, branch, min_runs, margin):
+    return conn.execute(f"""
+        WITH runs AS ({RUNS_QUERY}),
+        overall AS (
+            SELECT script, 1.0 * SUM(result != '{RESULT_SUCCESS}') / COUNT(*) AS rate
+            FROM runs GROUP BY script
+        )
+        SELECT runs.script AS script, runs.fmod AS fmod, COUNT(*) AS fmod_runs,
+               1.0 * SUM(runs.result != '{RESULT_SUCCESS}') / COUNT(*) AS fmod_rate,
+               overall.rate AS overall_rate
+        FROM runs JOIN overall ON runs.script = overall.script
+        GROUP BY runs.script, runs.fmod
+        HAVING fmod_runs >= :min_runs AND fmod_rate >= overall_rate + :margin
+        ORDER BY fmod_rate - overall_rate DESC, runs.script, runs.fmod
+        """, {"branch" : branch, "min_runs" : min_runs, "margin" : margin}).fetchall()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Reports trends from a pretest result history database (see summarizetests.py --ingest).")
+    parser.add_argument('db', type=str, help='SQLite history database.')
+    parser.add_argument('-b', '--branch', type=str, default=None, help='Only report on results from this branch.')
+    parser.add_argument('-m', '--min-runs', type=int, default=3, help='Ignore scripts (or script/FMOD pairs) with fewer runs than this. Default is 3.')
+    parser.add_argument('-n', '--num-rows', type=int, default=20, help='Maximum number of rows to print per report. Default is 20.')
+    parser.add_argument('--window', type=int, default=5, help='Number of latest successful runs compared against older runs for duration regressions. Default is 5.')
+    parser.add_argument('--threshold', type=float, default=1.5, help='Slowdown factor that counts as a duration regression. Default is 1.5.')
+    parser.add_argument('--margin', type=float, default=0.25, help='How much higher than the overall failure rate an FMOD\'s failure rate must be to be reported. Default is 0.25.')
+    args = parser.parse_args()
+    return args
+
+def print_rows(title, rows, max_rows, format_row):
+    print(f"{title}:")
+    if (len(rows) == 0):
+        print("- (none)")
+    for cur_row in rows[:max_rows]:
+        print(f"- {format_row(cur_row)}")
+    if (len(rows) > max_rows):
+        print(f"- ... and {len(rows) - max_rows} more")
+    print("")
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    if (not os.path.isfile(args.db)):
+        print(f"ERROR: {args.db} does not exist. Use summarizetests.py --ingest to create it.")
+        quit()
+
+    conn = open_history(args.db)
+    num_logs = conn.execute("SELECT COUNT(*) FROM logs WHERE (:branch IS NULL OR branch = :branch)", {"branch" : args.branch}).fetchone()[0]
+    print(f"History database: {args.db}")
+    if (args.branch is not None):
+        print(f"Branch: {args.branch}")
+    print(f"Test logs recorded: {num_logs}")
+    print("")
+
+    print_rows("Script failure rates", get_failure_rates(conn, args.branch, args.min_runs), args.num_rows,
+               lambda r: f"{r[0]} : {r[4]:.0%} of {r[1]} runs ({r[2]} failures, {r[3]} timeouts)")
+    print_rows("Flaky scripts (passed and failed on the same branch)", get_flaky_scripts(conn, args.branch, args.min_runs), args.num_rows,
+               lambda r: f"{r[1]} on {r[0]} : {r[3]} passes, {r[4]} failures")
+    print_rows("Duration regressions", get_duration_regressions(conn, args.branch, args.min_runs, args.window, args.threshold), args.num_rows,
+               lambda r: f"{r[0]} : {r[1]:.1f}s recently vs {r[2]:.1f}s before ({r[1] / r[2]:.1f}x)")
+    print_rows("FMOD correlations", get_fmod_correlations(conn, args.branch, args.min_runs, args.margin), args.num_rows,
+               lambda r: f"{r[0]} under {r[1] if r[1] else '(none)'} : {r[3]:.0%} of {r[2]} runs fail vs {r[4]:.0%} overall")
+    conn.close()